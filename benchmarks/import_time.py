@@ -0,0 +1,48 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["torch", "ultralytics", "transformers", "langdetect", "cv2", "PIL", "manga_ocr", "doctr", "easyocr",
+                 "paddleocr", "googletrans"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import src
+from config.settings import Settings
+Settings()
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure(runs: int) -> dict:
+    timings, heavy = [], set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return {"runs": runs, "median": statistics.median(timings), "max": max(timings), "heavy_modules": sorted(heavy)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Время холодного импорта `import src` + `Settings()`")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="Допустимая медиана в секундах")
+    args = parser.parse_args()
+
+    report = measure(args.runs)
+    report["budget"] = args.budget
+    report["ok"] = report["median"] <= args.budget and not report["heavy_modules"]
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import argparse
+import difflib
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SENTENCES = {
+    "ja": ["おい、待てよ！", "どうしてここにいるの？", "もう遅いから帰ろう。", "これは俺たちの最後の戦いだ。",
+           "ありがとう、君のおかげで助かった。", "何も言わないで。", "あの日のことを覚えている？", "行くぞ！"],
+    "en": ["Hey, wait for me!", "Why are you here?", "It's late, let's go home.", "This is our final battle.",
+           "Thank you, you saved me.", "Don't say anything.", "Do you remember that day?", "Let's go!"],
+}
+
+
+def rss_mb() -> float:
+    with open(f"/proc/{os.getpid()}/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_engine(load, sentences: list[str], repeat: int) -> dict:
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    model = load()
+    load_seconds = time.perf_counter() - started
+    rss_loaded = rss_mb()
+
+    model(sentences[:1])
+    timings, outputs = [], []
+    for _ in range(repeat):
+        outputs = []
+        for sentence in sentences:
+            started = time.perf_counter()
+            outputs.append(model([sentence])[0]["translation_text"])
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "outputs": outputs,
+        "load_seconds": round(load_seconds, 2),
+        "p50_ms": round(statistics.median(timings) * 1000, 1),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 1),
+        "model_rss_mb": round(rss_loaded - rss_before, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сравнение ONNX int8 и PyTorch движков перевода Helsinki-NLP")
+    parser.add_argument("--lang", choices=sorted(SENTENCES), default="en")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--num-beams", type=int, default=None)
+    parser.add_argument("--min-similarity", type=float, default=0.8,
+                        help="Минимальное среднее сходство переводов ONNX и PyTorch")
+    args = parser.parse_args()
+
+    from config.settings import settings
+    from src.onnx_translator import OnnxMarianTranslator
+
+    model_name = settings.TRANSLATION_MODELS[args.lang]
+    num_beams = args.num_beams or settings.TRANSLATE_NUM_BEAMS
+    sentences = SENTENCES[args.lang]
+
+    def _load_torch():
+        from transformers import pipeline
+        translator = pipeline("translation", model=model_name)
+        return lambda texts: translator(texts, num_beams=num_beams, max_length=settings.TRANSLATE_MAX_LENGTH)
+
+    def _load_onnx():
+        return OnnxMarianTranslator(model_name, settings.MODEL_DIR / "onnx", num_beams, settings.TRANSLATE_MAX_LENGTH)
+
+    # ONNX первым: экспорт использует torch, и его память не должна попасть в замер PyTorch движка
+    onnx_report = run_engine(_load_onnx, sentences, args.repeat)
+    torch_report = run_engine(_load_torch, sentences, args.repeat)
+
+    similarities = [difflib.SequenceMatcher(None, a, b).ratio()
+                    for a, b in zip(torch_report["outputs"], onnx_report["outputs"])]
+    report = {
+        "model": model_name,
+        "num_beams": num_beams,
+        "sentences": len(sentences),
+        "exact_match": sum(a == b for a, b in zip(torch_report["outputs"], onnx_report["outputs"])),
+        "mean_similarity": round(statistics.mean(similarities), 3),
+        "torch": torch_report,
+        "onnx": onnx_report,
+    }
+    report["ok"] = report["mean_similarity"] >= args.min_similarity
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
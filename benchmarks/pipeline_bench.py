@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# На машине без весов Settings() упадет на пустой MODEL_DIR, а stub-моделям веса не нужны
+_model_dir = ROOT / "models"
+if "--real" not in sys.argv and not (_model_dir.is_dir() and next(_model_dir.iterdir(), None) is not None):
+    _stub_model_dir = Path(tempfile.mkdtemp(prefix="bench-models-"))
+    (_stub_model_dir / "stub.pt").touch()
+    os.environ.setdefault("MODEL_DIR", str(_stub_model_dir))
+os.environ.setdefault("OCR_CACHE_ENABLED", "false")
+os.environ.setdefault("TRANSLATION_CACHE_ENABLED", "false")
+os.environ.setdefault("BATCH_MANIFEST", "false")
+
+import cv2  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from benchmarks.stubs import install_stubs  # noqa: E402
+from benchmarks.synthetic import make_page  # noqa: E402
+from config.settings import settings  # noqa: E402
+from src.pipeline import MangaTranslatorPipeline  # noqa: E402
+from src.registry import registry  # noqa: E402
+
+
+SCENARIOS = {
+    "small": [(800, 1200, 4), (1100, 1600, 8)],
+    "default": [(800, 1200, 4), (1100, 1600, 8), (1400, 2000, 12), (800, 4000, 16)],
+    "webtoon": [(800, 12000, 40), (1200, 20000, 60)],
+}
+OCR_BACKENDS = ["manga", "doctr", "easy", "paddle"]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(fn, items: list, repeat: int, warmup: int = 1) -> dict:
+    for item in items[:warmup]:
+        fn(item)
+    timings = []
+    for _ in range(repeat):
+        for item in items:
+            started = time.perf_counter()
+            fn(item)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    total = sum(timings)
+    return {
+        "calls": len(timings),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 3),
+        "throughput_per_s": round(len(timings) / total, 2) if total else None,
+    }
+
+
+def build_pipeline(ocr_type: str, real: bool) -> MangaTranslatorPipeline:
+    pipeline = MangaTranslatorPipeline(source_lang="en", selected_font="manga", ocr_type=ocr_type,
+                                       translator_type="transformers")
+    if not real:
+        install_stubs(registry, pipeline)
+    return pipeline
+
+
+def run(scenario: str, repeat: int, real: bool, workdir: Path) -> dict:
+    font_path = str(settings.FONT_DIR / "manga.ttf")
+    pages = [make_page(w, h, n, font_path, seed=i) for i, (w, h, n) in enumerate(SCENARIOS[scenario])]
+    crops = [page[y1:y2, x1:x2].copy() for page, bboxes in pages for x1, y1, x2, y2 in bboxes]
+    texts = [f"what is going on number {i}" for i in range(len(crops))]
+
+    input_dir = workdir / "input"
+    input_dir.mkdir(parents=True, exist_ok=True)
+    page_paths = []
+    for i, (page, _) in enumerate(pages):
+        path = input_dir / f"page_{i:03d}.jpg"
+        cv2.imwrite(str(path), page)
+        page_paths.append(str(path))
+
+    report = {"scenario": scenario, "real_models": real, "pages": len(pages), "bubbles": len(crops), "stages": {}}
+    stages = report["stages"]
+
+    pipeline = build_pipeline("easy", real)
+    stages["detect"] = measure(lambda path: pipeline.detector.detect(path), page_paths, repeat)
+
+    for ocr_type in OCR_BACKENDS if not real else [settings.SERVER_OCR_TYPE]:
+        recognizer = build_pipeline(ocr_type, real).ocr
+        # Пакетный Manga OCR идет напрямую через torch-модель, заглушка его не эмулирует
+        if not real and ocr_type == "manga":
+            stages["ocr_manga"] = measure(recognizer.recognize_mangaocr, crops, repeat)
+            continue
+        stages[f"ocr_{ocr_type}"] = measure(recognizer.recognize, crops, repeat)
+        stages[f"ocr_{ocr_type}_batch"] = measure(recognizer.recognize_batch, [crops], repeat)
+
+    stages["translate"] = measure(lambda text: pipeline.translator.translate(text, "en"), texts, repeat)
+    stages["translate_many"] = measure(lambda batch: pipeline.translator.translate_many(batch, "en"), [texts], repeat)
+
+    inpainter = pipeline.inpainter
+    cleaned = [inpainter.remove_text(crop.copy()) for crop in crops]
+    stages["remove_text"] = measure(lambda crop: inpainter.remove_text(crop.copy()), crops, repeat)
+    stages["draw_text"] = measure(lambda item: inpainter.draw_text(item[0][0].copy(), item[0][1], item[1]),
+                                  list(zip(cleaned, texts)), repeat)
+    stages["render_page"] = measure(
+        lambda item: pipeline.render_bubbles(item[0].copy(), item[1], ["x"] * len(item[1]), texts[:len(item[1])]),
+        pages, repeat)
+
+    def _end_to_end(run_index: int):
+        result = pipeline.process_batch(str(input_dir), str(workdir / f"output_{run_index}"), workers=1)
+        if result["failed"]:
+            raise RuntimeError(f"Ошибки при обработке страниц: {result['failed_files']}")
+
+    end_to_end = measure(_end_to_end, list(range(repeat)), 1, warmup=0)
+    end_to_end["pages_per_s"] = round(end_to_end["throughput_per_s"] * len(pages), 2)
+    stages["process_batch"] = end_to_end
+
+    report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for stage, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if previous[key] and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f"{stage}.{key}: {previous[key]} -> {current[key]}")
+    if baseline.get("peak_rss_mb") and report["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak_rss_mb: {baseline['peak_rss_mb']} -> {report['peak_rss_mb']}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк этапов пайплайна на синтетических страницах")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--real", action="store_true", help="Использовать настоящие модели вместо заглушек")
+    parser.add_argument("--baseline", type=Path, help="JSON с базовыми результатами для сравнения")
+    parser.add_argument("--save-baseline", type=Path, help="Сохранить результаты как базовые")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое замедление относительно базы")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        report = run(args.scenario, max(1, args.repeat), args.real, Path(workdir))
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        report["regressions"] = compare(report, baseline, args.tolerance)
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+
+class _StubTensor(np.ndarray):
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+def _tensor(values, dtype=np.float32) -> _StubTensor:
+    return np.asarray(values, dtype=dtype).view(_StubTensor)
+
+
+class _StubBoxes:
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray):
+        self.xyxy = _tensor(xyxy.reshape(-1, 4))
+        self.conf = _tensor(conf)
+        self.data = _tensor(np.column_stack([self.xyxy, self.conf, np.zeros_like(self.conf)]).reshape(-1, 6))
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield SimpleNamespace(xyxy=self.xyxy[i:i + 1], conf=self.conf[i:i + 1])
+
+
+class StubYOLO:
+    # Находит белые пузыри по контурам: детерминированно и с реальной стоимостью обработки
+
+    def __init__(self, min_area: int = 1500):
+        self.min_area = min_area
+
+    def _detect(self, img: np.ndarray):
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        _, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours:
+            if cv2.contourArea(contour) < self.min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((x, y, x + w, y + h))
+        xyxy = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        return SimpleNamespace(boxes=_StubBoxes(xyxy, np.full(len(boxes), 0.9, dtype=np.float32)))
+
+    def __call__(self, images, conf: float = 0.25, verbose: bool = True, **kwargs):
+        if isinstance(images, np.ndarray):
+            images = [images]
+        return [self._detect(img) for img in images]
+
+
+def _fake_text(image) -> str:
+    pixels = np.asarray(image)
+    dark = int((pixels < 128).sum())
+    return f"text {dark % 97} {pixels.shape[0]}x{pixels.shape[1]}"
+
+
+class StubMangaOcr:
+    def __call__(self, image) -> str:
+        return _fake_text(image)
+
+
+class StubDoctr:
+    def __call__(self, images):
+        pages = []
+        for image in images:
+            word = SimpleNamespace(value=_fake_text(image))
+            pages.append(SimpleNamespace(blocks=[SimpleNamespace(lines=[SimpleNamespace(words=[word])])]))
+        return SimpleNamespace(pages=pages)
+
+
+class StubEasyOcr:
+    def readtext(self, image, detail: int = 0, paragraph: bool = True):
+        return [_fake_text(image)]
+
+    def readtext_batched(self, images, detail: int = 0, paragraph: bool = True):
+        return [[_fake_text(image)] for image in images]
+
+
+class StubPaddle:
+    def predict(self, images):
+        if isinstance(images, np.ndarray):
+            return [{"rec_texts": [_fake_text(images)]}]
+        return [{"rec_texts": [_fake_text(image)]} for image in images]
+
+
+STUB_OCR = {"manga": StubMangaOcr, "doctr": StubDoctr, "easy": StubEasyOcr, "paddle": StubPaddle}
+
+
+class StubTranslationPipeline:
+    def _translate(self, text: str) -> str:
+        return text[::-1].upper()
+
+    def __call__(self, texts, batch_size: int = 1, **kwargs):
+        if isinstance(texts, str):
+            return [{"translation_text": self._translate(texts)}]
+        return [{"translation_text": self._translate(text)} for text in texts]
+
+
+def install_stubs(registry, pipeline):
+    registry.register(("yolo", pipeline.detector.model_path), StubYOLO())
+    registry.register(pipeline.ocr.model_key, STUB_OCR[pipeline.ocr.ocr_type]())
+    from config.settings import settings
+    for model_name in settings.TRANSLATION_MODELS.values():
+        registry.register(("translation", model_name), StubTranslationPipeline())
@@ -0,0 +1,51 @@
+import random
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+WORDS = ["hey", "what", "no way", "run", "wait", "BOOM", "why", "it's", "over", "there", "again", "help", "I", "know", "you"]
+
+
+def make_page(width: int, height: int, n_bubbles: int, font_path: str, seed: int = 0) -> tuple[np.ndarray, list]:
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+
+    # Серый фон со "скринтоном" и штрихами, чтобы пороговая обработка не находила лишних белых областей
+    page = np_rng.integers(90, 200, size=(height, width), dtype=np.uint8)
+    page = cv2.GaussianBlur(page, (5, 5), 0)
+    page = cv2.cvtColor(page, cv2.COLOR_GRAY2BGR)
+    for _ in range(max(4, (width * height) // 40000)):
+        p1 = (rng.randrange(width), rng.randrange(height))
+        p2 = (rng.randrange(width), rng.randrange(height))
+        cv2.line(page, p1, p2, (20, 20, 20), rng.randint(1, 4))
+
+    bboxes = []
+    attempts = 0
+    while len(bboxes) < n_bubbles and attempts < n_bubbles * 50:
+        attempts += 1
+        # Размер пузыря от короткой стороны, чтобы на длинных полосах вебтуна пузыри оставались реалистичными
+        short_side = min(width, height)
+        bw = rng.randint(max(60, short_side // 10), max(80, short_side // 4))
+        bh = rng.randint(max(50, short_side // 14), max(70, short_side // 6))
+        x1, y1 = rng.randint(5, max(6, width - bw - 5)), rng.randint(5, max(6, height - bh - 5))
+        x2, y2 = x1 + bw, y1 + bh
+        if x2 >= width or y2 >= height:
+            continue
+        if any(x1 < bx2 + 8 and bx1 < x2 + 8 and y1 < by2 + 8 and by1 < y2 + 8 for bx1, by1, bx2, by2 in bboxes):
+            continue
+        center, axes = ((x1 + x2) // 2, (y1 + y2) // 2), (bw // 2 - 2, bh // 2 - 2)
+        cv2.ellipse(page, center, axes, 0, 0, 360, (255, 255, 255), cv2.FILLED)
+        cv2.ellipse(page, center, axes, 0, 0, 360, (0, 0, 0), 2)
+        bboxes.append((x1, y1, x2, y2))
+
+    pil_page = Image.fromarray(cv2.cvtColor(page, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(pil_page)
+    for x1, y1, x2, y2 in bboxes:
+        font = ImageFont.truetype(font_path, max(10, (y2 - y1) // 6))
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        text_width = draw.textlength(text, font=font)
+        draw.text(((x1 + x2 - text_width) / 2, (y1 + y2) / 2 - font.size / 2), text, font=font, fill=(0, 0, 0))
+    page = cv2.cvtColor(np.asarray(pil_page), cv2.COLOR_RGB2BGR)
+    return page, bboxes
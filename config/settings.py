@@ -15,7 +15,73 @@ class Settings(BaseSettings):
     YOLO_MODEL_PATH: Path = MODEL_DIR / "yolo_best.pt"
     OCR_GPU: bool = False
 
+    MODEL_IDLE_TIMEOUT: float = 1800.0
+
+    SERVER_SOURCE_LANG: str | None = None
+    SERVER_FONT: str = "manga"
+    SERVER_OCR_TYPE: str = "manga"
+    SERVER_TRANSLATOR_TYPE: str = "transformers"
+    SERVER_MAX_BATCH_SIZE: int = 8
+    SERVER_BATCH_LATENCY_MS: float = 20.0
+    SERVER_MAX_PENDING: int = 32
+    SERVER_REQUEST_TIMEOUT: float = 120.0
+
+    BATCH_WORKERS: int = 1
+    BATCH_MANIFEST: bool = True
+    PROFILE_BATCH: bool = False
+    WORKER_MEMORY_MB: int = 3072
+
+    STREAMING_PIPELINE: bool = True
+    STAGE_QUEUE_SIZE: int = 4
+    # Длинная полоса вебтуна в декодированном виде занимает десятки мегабайт, поэтому
+    # число страниц в памяти ограничивается еще и объемом пикселей
+    STAGE_MEMORY_MB: int = 1024
+
+    DETECT_BATCH_SIZE: int = 8
+    DECODE_WORKERS: int = 4
+    DECODE_MEMORY_MB: int = 512
+    # Вебтуны и большие сканы детектируются перекрывающимися окнами, а отрисовываются полосами
+    DETECT_TILED: bool = True
+    DETECT_TILE_SIZE: int = 1280
+    DETECT_TILE_OVERLAP: int = 320
+    DETECT_TILE_ASPECT: float = 2.5
+    DETECT_TILE_MAX_SIDE: int = 4096
+    DETECT_TILE_BATCH_SIZE: int = 8
+    DETECT_MERGE_IOU: float = 0.5
+    RENDER_BAND_HEIGHT: int = 2048
+    OCR_BATCH_SIZE: int = 16
+    OCR_PAGE_GROUP: int = 8
+    TRANSLATION_MODELS: dict[str, str] = {
+        "ja": "Helsinki-NLP/opus-mt-ja-ru",
+        "en": "Helsinki-NLP/opus-mt-en-ru",
+    }
+    TRANSLATE_BATCH_SIZE: int = 16
+    # "onnx": экспорт моделей Helsinki-NLP в ONNX с int8 квантизацией для CPU (нужен optimum[onnxruntime])
+    TRANSLATE_ENGINE: str = "torch"
+    TRANSLATE_NUM_BEAMS: int = 4
+    TRANSLATE_MAX_LENGTH: int = 512
+    TRANSLATE_PACKING: bool = True
+    TRANSLATE_PACK_MAX_CHARS: int = 400
+    TRANSLATE_PACK_DELIMITER: str = " ||| "
+    TRANSLATE_CONCURRENCY: int = 8
+    TRANSLATE_TIMEOUT: float = 10.0
+    TRANSLATE_RETRIES: int = 3
+    TRANSLATE_BACKOFF: float = 0.5
+    GOOGLE_SERVICE_URLS: list[str] = []
+
+    CACHE_DIR: Path = DATA_DIR / "cache"
+    TRANSLATION_CACHE_ENABLED: bool = True
+    TRANSLATION_CACHE_PATH: Path = CACHE_DIR / "translations.sqlite3"
+    TRANSLATION_CACHE_SIZE: int = 100_000
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_SIZE: int = 10_000
+    OCR_CACHE_DISK: bool = False
+    OCR_CACHE_PATH: Path = CACHE_DIR / "ocr.sqlite3"
+
     MAX_FILE_SIZE_MB: int = 5
+    # Streamlit отдает download_button только из памяти: больший архив остается на диске в OUTPUT_DIR
+    WEB_ARCHIVE_MAX_MB: int = 200
+    WEB_ARCHIVE_TTL_HOURS: float = 24.0
     SUPPORTED_EXTENSIONS: list[str] = [".jpg"]
     SUPPORTED_LANGUAGES: list[str] = ["ja", "en"]
 
@@ -42,9 +108,8 @@ class Settings(BaseSettings):
                 raise ValueError(f"{directory} существует, но это не директория")
 
             if not is_empty:
-                bowels = list(directory.glob("*"))
-
-                if not bowels:
+                # Достаточно первого элемента, полный обход директории не нужен
+                if next(directory.iterdir(), None) is None:
                     raise ValueError(f"{directory} должна быть не пустой")
 
 
@@ -1,8 +1,7 @@
 import base64
 import io
-import os
 import tempfile
-import zipfile
+import time
 from pathlib import Path
 
 import streamlit as st
@@ -10,6 +9,8 @@ from PIL import Image, ImageDraw, ImageFont
 
 from config.settings import settings
 from src import MangaTranslatorPipeline
+from src.archive import ChapterArchive
+from src.registry import registry
 
 
 if "pipeline" not in st.session_state:
@@ -17,6 +18,21 @@ if "pipeline" not in st.session_state:
 if "results" not in st.session_state:
     st.session_state.results = None
 
+ARCHIVE_PREFIX = "batch_"
+
+
+def remove_stale_archives():
+    # Архивы закрытых сессий никто не удалит, кроме следующих запусков
+    expires = time.time() - settings.WEB_ARCHIVE_TTL_HOURS * 3600
+    for path in settings.OUTPUT_DIR.glob(f"{ARCHIVE_PREFIX}*"):
+        try:
+            if path.stat().st_mtime < expires:
+                path.unlink()
+        except OSError:
+            pass
+
+registry.unload_idle(settings.MODEL_IDLE_TIMEOUT)
+
 
 def _get_available_fonts() -> list:
     font_files = []
@@ -101,6 +117,7 @@ with st.sidebar:
                 ocr_type=ocr_type,
                 translator_type=translator_type
             )
+            st.session_state.pipeline.preload()
             st.success("Пайплайн готов к работе!")
         except Exception as e:
             st.error(f"Ошибка инициализации: {e}")
@@ -118,7 +135,7 @@ with tab1:
     delete_checkbox = st.checkbox(
         "Удалить изображения",
         value=False,
-        help="Если отмечено, изображения будут удалены после обработки"
+        help="Если не отмечено, исходное изображение и результат сохраняются в data/in и data/out"
     )
 
     uploaded_file = st.file_uploader(
@@ -132,27 +149,21 @@ with tab1:
 
         with col1:
             st.subheader("Оригинал")
-            image = Image.open(uploaded_file)
-            st.image(image, width="content")
+            st.image(uploaded_file.getvalue(), width="content")
 
         if st.button("🚀 Начать перевод", type="primary"):
             with st.spinner("Обработка..."):
-                with tempfile.NamedTemporaryFile(dir=settings.INPUT_DIR, delete=False, suffix=".jpg") as tmp_file:
-                    image.save(tmp_file.name)
-                    input_path = tmp_file.name
-
-                with tempfile.NamedTemporaryFile(dir=settings.OUTPUT_DIR, delete=False, suffix=".jpg") as tmp_output:
-                    output_path = tmp_output.name
-
-                success = st.session_state.pipeline.process_image(input_path, output_path)
-                if success:
+                input_bytes = uploaded_file.getvalue()
+                try:
+                    img_bytes = st.session_state.pipeline.process_bytes(input_bytes, fmt="jpg")
+                except Exception as e:
+                    img_bytes = None
+                    st.error(f"Ошибка обработки: {e}")
+
+                if img_bytes:
                     with col2:
                         st.subheader("Результат перевода")
-                        result_image = Image.open(output_path)
-                        st.image(result_image, width="content")
-
-                    with open(output_path, "rb") as f:
-                        img_bytes = f.read()
+                        st.image(img_bytes, width="content")
 
                     st.download_button(
                         label="💾 Скачать результат",
@@ -161,9 +172,11 @@ with tab1:
                         mime="image/jpg"
                     )
 
-                if delete_checkbox:
-                    os.unlink(input_path)
-                    os.unlink(output_path)
+                    if not delete_checkbox:
+                        with tempfile.NamedTemporaryFile(dir=settings.INPUT_DIR, delete=False, suffix=".jpg") as tmp_file:
+                            tmp_file.write(input_bytes)
+                        with tempfile.NamedTemporaryFile(dir=settings.OUTPUT_DIR, delete=False, suffix=".jpg") as tmp_output:
+                            tmp_output.write(img_bytes)
 
 
 with tab2:
@@ -177,37 +190,46 @@ with tab2:
         key="batch_upload"
     )
 
+    archive_format = st.radio("Формат архива", ["zip", "cbz"], horizontal=True, key="archive_format")
+
     if uploaded_files and st.session_state.pipeline:
         if st.button("🚀 Перевести все", type="primary"):
             with st.spinner(f"Перевод {len(uploaded_files)} изображений..."):
-                with tempfile.TemporaryDirectory(dir=settings.DATA_DIR) as tmp_input:
-                    with tempfile.TemporaryDirectory(dir=settings.DATA_DIR) as tmp_output:
-                        for i, uploaded_file in enumerate(uploaded_files):
-                            file_path = Path(tmp_input) / uploaded_file.name
-                            with open(file_path, "wb") as f:
-                                f.write(uploaded_file.getvalue())
-
-                        results = st.session_state.pipeline.process_batch(tmp_input, tmp_output)
-
-                        zip_buffer = io.BytesIO()
-                        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                            for file in Path(tmp_output).iterdir():
-                                zip_file.write(file, file.name)
-
-                        zip_buffer.seek(0)
-
-                        st.success(f"Обработано: {results['success']}/{results['total']}")
-
-                        if results["failed"] > 0:
-                            st.warning(f"Не удалось обработать: {results['failed']}")
-                            for fname in results["failed_files"]:
-                                st.write(f"- {fname}")
-
+                # Архив пишется на диск постранично, в памяти держится только текущий пакет страниц
+                previous_archive = st.session_state.get("archive_path")
+                if previous_archive:
+                    Path(previous_archive).unlink(missing_ok=True)
+                remove_stale_archives()
+                with tempfile.NamedTemporaryFile(dir=settings.OUTPUT_DIR, delete=False, prefix=ARCHIVE_PREFIX,
+                                                 suffix=f".{archive_format}") as tmp_archive:
+                    archive_path = tmp_archive.name
+                st.session_state.archive_path = archive_path
+
+                items = ((uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files)
+                with ChapterArchive(archive_path) as archive:
+                    results = st.session_state.pipeline.process_bytes_to_archive(items, archive, fmt="jpg")
+
+                st.success(f"Обработано: {results['success']}/{results['total']}")
+
+                if results["failed"] > 0:
+                    st.warning(f"Не удалось обработать: {results['failed']}")
+                    for fname in results["failed_files"]:
+                        st.write(f"- {fname}")
+
+                # download_button загружает архив в память сервера Streamlit целиком, поэтому размер ограничен
+                archive_mb = Path(archive_path).stat().st_size / (1024 * 1024)
+                if archive_mb > settings.WEB_ARCHIVE_MAX_MB:
+                    st.warning(
+                        f"Архив {archive_mb:.0f}MB больше лимита скачивания {settings.WEB_ARCHIVE_MAX_MB}MB. "
+                        f"Он сохранен на сервере: {archive_path}. Для больших глав используйте CLI с --zip"
+                    )
+                else:
+                    with open(archive_path, "rb") as archive_file:
                         st.download_button(
                             label=f"📦 Скачать все результаты ({results['success']} файлов)",
-                            data=zip_buffer,
-                            file_name="translated.zip",
-                            mime="application/zip"
+                            data=archive_file,
+                            file_name=f"translated.{archive_format}",
+                            mime="application/vnd.comicbook+zip" if archive_format == "cbz" else "application/zip"
                         )
 
 
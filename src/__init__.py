@@ -1 +1,9 @@
-from .pipeline import MangaTranslatorPipeline
+__all__ = ["MangaTranslatorPipeline"]
+
+
+def __getattr__(name: str):
+    # Пайплайн тянет cv2/numpy и бэкенды моделей, поэтому импортируется только при обращении
+    if name == "MangaTranslatorPipeline":
+        from .pipeline import MangaTranslatorPipeline
+        return MangaTranslatorPipeline
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
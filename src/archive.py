@@ -0,0 +1,82 @@
+import os
+import shutil
+import threading
+import zipfile
+from pathlib import Path
+from typing import BinaryIO
+
+from loguru import logger
+
+
+# Уже сжатые форматы: повторный DEFLATE только тратит CPU и почти не уменьшает размер
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".webp", ".png"}
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class ChapterArchive:
+    def __init__(self, target: str | Path | BinaryIO, compresslevel: int = 6):
+        self.target = target
+        self.compresslevel = compresslevel
+        self._zip = zipfile.ZipFile(target, "w", allowZip64=True)
+        self._names = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_files(cls, target: str | Path, files: list[Path]) -> int:
+        # Архив собирается заново во временный файл и атомарно заменяет старый:
+        # перерисованные страницы не остаются в архиве в старой версии
+        target = Path(target)
+        tmp_path = target.with_name(f"{target.name}.tmp")
+        try:
+            with cls(tmp_path) as archive:
+                for path in files:
+                    archive.add_file(path)
+                count = len(archive)
+            os.replace(tmp_path, target)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return count
+
+    def _compress_type(self, name: str) -> int:
+        return zipfile.ZIP_STORED if Path(name).suffix.lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._names
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add_bytes(self, name: str, data: bytes) -> bool:
+        with self._lock:
+            if name in self._names:
+                logger.warning(f"{name} уже есть в архиве, пропуск")
+                return False
+            self._zip.writestr(name, data, compress_type=self._compress_type(name), compresslevel=self.compresslevel)
+            self._names.add(name)
+        return True
+
+    def add_file(self, path: str | Path, name: str | None = None) -> bool:
+        path = Path(path)
+        name = name or path.name
+        compress_type = self._compress_type(name)
+        with self._lock:
+            if name in self._names:
+                logger.warning(f"{name} уже есть в архиве, пропуск")
+                return False
+            info = zipfile.ZipInfo.from_file(path, name)
+            info.compress_type = compress_type
+            # Копирование блоками: страница не читается в память целиком
+            with open(path, "rb") as src, self._zip.open(info, "w", force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+            self._names.add(name)
+        return True
+
+    def close(self):
+        with self._lock:
+            self._zip.close()
+
+    def __enter__(self) -> "ChapterArchive":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
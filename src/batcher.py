@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Callable
+
+from loguru import logger
+
+
+class MicroBatcher:
+    def __init__(self, fn: Callable[[list], list], max_batch_size: int = 16, max_latency: float = 0.01, name: str = ""):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_latency = max_latency
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item: Any) -> Any:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def submit_many(self, items: list) -> list:
+        return list(await asyncio.gather(*(self.submit(item) for item in items)))
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        # Ждем остальные элементы не дольше max_latency после первого
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = await asyncio.to_thread(self.fn, [item for item, _ in batch])
+            except Exception as e:
+                logger.error(f"Ошибка пакетной обработки {self.name}: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "items": self.items, "pending": self.pending}
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+
+class SQLiteLRUCache:
+    def __init__(self, path: Path, table: str, max_entries: int = 100_000):
+        self.path = Path(path)
+        self.table = table
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        # После fork соединение SQLite нельзя переиспользовать, открываем новое в каждом процессе
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get_many(self, keys: list[str]) -> dict[str, str]:
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})", chunk)
+                found.update(rows.fetchall())
+            if found:
+                now = time.time()
+                conn.executemany(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", [(now, key) for key in found])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> str | None:
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: dict[str, str]):
+        if not items:
+            return
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            conn.executemany(f"INSERT OR REPLACE INTO {self.table} (key, value, accessed) VALUES (?, ?, ?)",
+                             [(key, value, now) for key, value in items.items()])
+            self._evict(conn)
+
+    def set(self, key: str, value: str):
+        self.set_many({key: value})
+
+    def _evict(self, conn: sqlite3.Connection):
+        size = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        excess = size - self.max_entries
+        if excess > 0:
+            conn.execute(f"DELETE FROM {self.table} WHERE key IN "
+                         f"(SELECT key FROM {self.table} ORDER BY accessed ASC LIMIT ?)", (excess,))
+            logger.debug(f"Кэш {self.table}: удалено {excess} устаревших записей")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self), "max_entries": self.max_entries}
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute(f"DELETE FROM {self.table}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class TranslationCache(SQLiteLRUCache):
+    def __init__(self, path: Path, max_entries: int = 100_000):
+        super().__init__(path, "translations", max_entries)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    @classmethod
+    def make_key(cls, text: str, source_lang: str, target_lang: str, translator_type: str) -> str:
+        return "\x1f".join((translator_type or "", source_lang or "", target_lang or "", cls.normalize(text)))
+
+
+class OCRCache:
+    def __init__(self, max_entries: int = 10_000, path: Path | None = None, max_disk_entries: int = 100_000):
+        self.max_entries = max_entries
+        self.memory: OrderedDict[str, str] = OrderedDict()
+        self.disk = SQLiteLRUCache(path, "ocr", max_disk_entries) if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image: np.ndarray, ocr_type: str) -> str:
+        image = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(image.data, digest_size=20)
+        digest.update(f"{image.shape}{image.dtype}".encode())
+        return f"{ocr_type}:{digest.hexdigest()}"
+
+    def get_many(self, keys: list[str]) -> dict[str, str]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+            self.hits += len(found)
+
+        missing = [key for key in keys if key not in found]
+        if self.disk is not None and missing:
+            try:
+                from_disk = self.disk.get_many(missing)
+            except Exception as e:
+                logger.warning(f"Ошибка чтения дискового кэша OCR: {e}")
+                from_disk = {}
+            self._remember(from_disk)
+            found.update(from_disk)
+            self.disk_hits += len(from_disk)
+
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items: dict[str, str]):
+        self._remember(items)
+        if self.disk is not None and items:
+            try:
+                self.disk.set_many(items)
+            except Exception as e:
+                logger.warning(f"Ошибка записи в дисковый кэш OCR: {e}")
+
+    def _remember(self, items: dict[str, str]):
+        with self._lock:
+            for key, value in items.items():
+                self.memory[key] = value
+                self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        stats = {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self.memory),
+                 "max_entries": self.max_entries}
+        if self.disk is not None:
+            stats["disk_size"] = len(self.disk)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from loguru import logger
+
+
+def _override_setting(name: str, value):
+    from config.settings import settings
+
+    if value is None:
+        return
+    setattr(settings, name, value)
+    # Дочерние процессы (spawn) читают настройки из окружения
+    os.environ[name] = json.dumps(value) if isinstance(value, (list, dict)) else str(value)
+
+
+def _translate(args: argparse.Namespace) -> int:
+    from .archive import STORED_EXTENSIONS, ChapterArchive
+    from .pipeline import MangaTranslatorPipeline
+
+    _override_setting("DETECT_BATCH_SIZE", args.detect_batch_size)
+    _override_setting("OCR_BATCH_SIZE", args.ocr_batch_size)
+    _override_setting("OCR_PAGE_GROUP", args.ocr_page_group)
+    _override_setting("TRANSLATE_BATCH_SIZE", args.translate_batch_size)
+    _override_setting("TRANSLATE_ENGINE", args.translate_engine)
+
+    input_dir, output_dir = Path(args.input_dir), Path(args.output_dir)
+    if not input_dir.is_dir():
+        logger.error(f"Входная директория не найдена: {input_dir}")
+        return 2
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    pipeline = MangaTranslatorPipeline(
+        yolo_model_path=args.yolo_model,
+        source_lang=None if args.source_lang == "auto" else args.source_lang,
+        selected_font=args.font,
+        ocr_type=args.ocr,
+        translator_type=args.translator,
+    )
+    # Модели грузятся лениво: без предзагрузки недоступная модель обнаружится только на страницах
+    try:
+        pipeline.preload()
+    except Exception as e:
+        logger.error(f"Не удалось загрузить модели: {e!r}")
+        return 2
+
+    # При --resume часть страниц перерисовывается, поэтому архив пересобирается из output_dir в конце,
+    # иначе в нем остались бы старые версии страниц
+    archive = ChapterArchive(args.zip) if args.zip and not args.resume else None
+
+    def _on_page_done(input_path: Path, output_path: Path, success: bool):
+        if archive is not None and success and output_path.exists():
+            archive.add_file(output_path)
+        logger.info(f"{'OK' if success else 'FAIL'} {input_path.name}")
+
+    started = time.perf_counter()
+    try:
+        results = pipeline.process_batch(str(input_dir), str(output_dir), workers=args.workers, resume=args.resume,
+                                         on_page_done=_on_page_done, profile=args.profile)
+    finally:
+        if archive is not None:
+            archive.close()
+    if args.zip and args.resume:
+        failed = set(results["failed_files"])
+        pages = sorted(path for path in output_dir.iterdir()
+                       if path.is_file() and path.suffix.lower() in STORED_EXTENSIONS and path.name not in failed)
+        logger.info(f"Архив {args.zip} пересобран: {ChapterArchive.from_files(args.zip, pages)} страниц")
+    elapsed = time.perf_counter() - started
+    if args.metrics:
+        Path(args.metrics).write_text(pipeline.prometheus_metrics(), encoding="utf-8")
+
+    processed = results["total"] - results.get("skipped", 0)
+    results["elapsed_seconds"] = round(elapsed, 3)
+    results["pages_per_second"] = round(processed / elapsed, 3) if elapsed > 0 else None
+    results["output_dir"] = str(output_dir)
+    if args.zip:
+        results["archive"] = str(args.zip)
+    print(json.dumps(results, ensure_ascii=False, default=str))
+    return 0 if results["failed"] == 0 else 1
+
+
+def _serve(args: argparse.Namespace) -> int:
+    try:
+        import uvicorn
+    except ImportError:
+        logger.error("Для HTTP сервиса необходим uvicorn: uv pip install uvicorn")
+        return 2
+
+    from .pipeline import MangaTranslatorPipeline
+    from .server import create_app
+
+    _override_setting("TRANSLATE_ENGINE", args.translate_engine)
+    pipeline = MangaTranslatorPipeline(
+        yolo_model_path=args.yolo_model,
+        source_lang=None if args.source_lang == "auto" else args.source_lang,
+        selected_font=args.font,
+        ocr_type=args.ocr,
+        translator_type=args.translator,
+    )
+    app = create_app(pipeline, max_batch_size=args.max_batch_size, batch_latency_ms=args.batch_latency_ms,
+                     max_pending=args.max_pending, request_timeout=args.request_timeout)
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level.lower())
+    return 0
+
+
+def _add_pipeline_arguments(parser: argparse.ArgumentParser, translator_default: str):
+    parser.add_argument("--source-lang", choices=["ja", "en", "auto"], default="auto")
+    parser.add_argument("--ocr", choices=["manga", "paddle", "doctr", "easy"], default="manga")
+    parser.add_argument("--translator", choices=["google", "transformers"], default=translator_default)
+    parser.add_argument("--font", default="manga", help="Имя шрифта из FONT_DIR без расширения")
+    parser.add_argument("--yolo-model", default=None, help="Путь к весам YOLO (по умолчанию YOLO_MODEL_PATH)")
+    parser.add_argument("--translate-engine", choices=["torch", "onnx"], default=None,
+                        help="Движок моделей transformers: torch или ONNX int8 для CPU (по умолчанию TRANSLATE_ENGINE)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src", description="Переводчик манги без веб-интерфейса")
+    parser.add_argument("--log-level", default="INFO", help="Уровень логирования (stderr)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    translate = subparsers.add_parser("translate", help="Перевести все изображения из директории")
+    translate.add_argument("input_dir")
+    translate.add_argument("output_dir")
+    _add_pipeline_arguments(translate, translator_default="google")
+    translate.add_argument("--workers", type=int, default=None, help="Число процессов (по умолчанию BATCH_WORKERS)")
+    translate.add_argument("--detect-batch-size", type=int, default=None)
+    translate.add_argument("--ocr-batch-size", type=int, default=None)
+    translate.add_argument("--ocr-page-group", type=int, default=None)
+    translate.add_argument("--translate-batch-size", type=int, default=None)
+    translate.add_argument(
+        "--resume", action="store_true",
+        help="Пропускать неизмененные страницы по манифесту задачи, перерисовывать без OCR при смене шрифта или переводчика",
+    )
+    translate.add_argument("--zip", default=None,
+                           help="Дополнительно складывать готовые страницы в архив (.zip или .cbz) по мере обработки")
+    translate.add_argument("--profile", action="store_true", help="Сохранить профиль cProfile рядом с выходной директорией")
+    translate.add_argument("--metrics", default=None, help="Записать счетчики в формате Prometheus в файл")
+    translate.set_defaults(handler=_translate)
+
+    serve = subparsers.add_parser("serve", help="Запустить HTTP сервис (ASGI, uvicorn)")
+    _add_pipeline_arguments(serve, translator_default="transformers")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--max-batch-size", type=int, default=None)
+    serve.add_argument("--batch-latency-ms", type=float, default=None)
+    serve.add_argument("--max-pending", type=int, default=None)
+    serve.add_argument("--request-timeout", type=float, default=None)
+    serve.set_defaults(handler=_serve)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level.upper())
+    return args.handler(args)
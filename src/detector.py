@@ -1,50 +1,279 @@
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Tuple
 
 import cv2
 import numpy as np
+from PIL import Image
 from loguru import logger
-from ultralytics import YOLO
+
+from .metrics import PipelineMetrics
+from .registry import registry
+
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+
+def _axis_windows(length: int, tile: int, overlap: int) -> list[tuple[int, int]]:
+    if length <= tile:
+        return [(0, length)]
+    step = max(1, tile - overlap)
+    starts = list(range(0, length - tile, step)) + [length - tile]
+    return [(start, start + tile) for start in starts]
+
+
+def merge_boxes(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5,
+                containment_threshold: float = 0.8) -> np.ndarray:
+    # Жадное NMS по уверенности, но поглощенные рамки расширяют оставшуюся: обрезанный краем окна
+    # пузырь и его полная копия из соседнего окна сливаются в одну рамку
+    if len(boxes) == 0:
+        return boxes.reshape(0, 4)
+    boxes = boxes.astype(np.float32, copy=False)
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    order = np.argsort(-scores, kind="stable")
+    merged = []
+    while order.size:
+        current, rest = order[0], order[1:]
+        x1 = np.maximum(boxes[current, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[current, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[current, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[current, 3], boxes[rest, 3])
+        inter = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+        iou = inter / np.maximum(areas[current] + areas[rest] - inter, 1e-6)
+        containment = inter / np.maximum(np.minimum(areas[current], areas[rest]), 1e-6)
+        duplicate = (iou > iou_threshold) | (containment > containment_threshold)
+
+        group = np.concatenate(([current], rest[duplicate]))
+        merged.append([boxes[group, 0].min(), boxes[group, 1].min(), boxes[group, 2].max(), boxes[group, 3].max()])
+        order = rest[~duplicate]
+    return np.asarray(merged, dtype=np.float32)
+
+
+def merge_seams(boxes: np.ndarray, scores: np.ndarray, windows: np.ndarray, img_shape: tuple,
+                min_overlap: float = 0.5, tolerance: int = 2) -> tuple[np.ndarray, np.ndarray]:
+    # Пузырь больше перекрытия окон не помещается целиком ни в одно окно, и его обрезанные половины
+    # не проходят ни IoU, ни вложенность. Половины из разных окон сливаются, если хотя бы одна упирается
+    # во внутренний шов своего окна, они пересекаются и почти совпадают по протяженности вдоль шва
+    if len(boxes) < 2:
+        return boxes, scores
+    h, w = img_shape[:2]
+    touches_horizontal_seam = (((boxes[:, 1] <= windows[:, 1] + tolerance) & (windows[:, 1] > 0))
+                               | ((boxes[:, 3] >= windows[:, 3] - tolerance) & (windows[:, 3] < h)))
+    touches_vertical_seam = (((boxes[:, 0] <= windows[:, 0] + tolerance) & (windows[:, 0] > 0))
+                             | ((boxes[:, 2] >= windows[:, 2] - tolerance) & (windows[:, 2] < w)))
+
+    ix = np.minimum(boxes[:, None, 2], boxes[None, :, 2]) - np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    iy = np.minimum(boxes[:, None, 3], boxes[None, :, 3]) - np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    widths = boxes[:, 2] - boxes[:, 0]
+    heights = boxes[:, 3] - boxes[:, 1]
+    x_overlap = ix / np.maximum(np.minimum(widths[:, None], widths[None, :]), 1e-6)
+    y_overlap = iy / np.maximum(np.minimum(heights[:, None], heights[None, :]), 1e-6)
+    other_window = (windows[:, None, :] != windows[None, :, :]).any(axis=2)
+    seam = ((touches_horizontal_seam[:, None] | touches_horizontal_seam[None, :]) & (x_overlap >= min_overlap)
+            | (touches_vertical_seam[:, None] | touches_vertical_seam[None, :]) & (y_overlap >= min_overlap))
+    connected = other_window & (ix > 0) & (iy > 0) & seam
+
+    # Компоненты связности: пузырь на пересечении четырех окон собирается из всех частей
+    parent = list(range(len(boxes)))
+
+    def _find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in np.argwhere(np.triu(connected, 1)):
+        parent[_find(i)] = _find(j)
+    roots = np.array([_find(i) for i in range(len(boxes))])
+    groups = [np.flatnonzero(roots == root) for root in np.unique(roots)]
+    merged = np.array([[boxes[g, 0].min(), boxes[g, 1].min(), boxes[g, 2].max(), boxes[g, 3].max()] for g in groups],
+                      dtype=boxes.dtype)
+    return merged, np.array([scores[g].max() for g in groups], dtype=scores.dtype)
 
 
 class BubbleDetector:
-    def __init__(self, model_path: str, conf_threshold: float = 0.25):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path: str, conf_threshold: float = 0.25, metrics: PipelineMetrics | None = None,
+                 tile_size: int | None = None, tile_overlap: int = 320, tile_aspect: float = 2.5,
+                 tile_max_side: int = 4096, merge_iou: float = 0.5, tile_batch_size: int = 8):
+        self.model_path = model_path
         self.conf_threshold = conf_threshold
+        self.metrics = metrics or PipelineMetrics()
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_aspect = tile_aspect
+        self.tile_max_side = tile_max_side
+        self.merge_iou = merge_iou
+        self.tile_batch_size = max(1, tile_batch_size)
         logger.info(f"Детектор инициализирован с моделью {model_path}")
 
-    def detect(self, image_path: str) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+    @property
+    def model(self) -> "YOLO":
+        return registry.get(("yolo", self.model_path), self._load_model)
+
+    def _load_model(self) -> "YOLO":
+        from ultralytics import YOLO
+        return YOLO(self.model_path)
+
+    def _result_boxes(self, result) -> tuple[np.ndarray, np.ndarray]:
+        # Одна передача device->host на результат: data хранит xyxy, conf и cls всех рамок
+        data = result.boxes.data.cpu().numpy().reshape(-1, 6)
+        keep = data[:, 4] >= self.conf_threshold
+        return data[keep, :4], data[keep, 4]
+
+    def _finalize(self, boxes: np.ndarray, scores: np.ndarray, img_shape: tuple) -> np.ndarray:
+        h, w = img_shape[:2]
+        padding = 5
+        boxes = merge_boxes(boxes, scores, self.merge_iou).astype(np.int32)
+        boxes += np.array([-padding, -padding, padding, padding], dtype=np.int32)
+        np.clip(boxes, 0, np.array([w, h, w, h], dtype=np.int32), out=boxes)
+        return boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+
+    def _extract_bboxes(self, result, img_shape: tuple) -> np.ndarray:
+        return self._finalize(*self._result_boxes(result), img_shape)
+
+    def needs_tiling(self, img_shape: tuple) -> bool:
+        if not self.tile_size:
+            return False
+        h, w = img_shape[:2]
+        return max(h, w) > self.tile_max_side or max(h, w) / max(1, min(h, w)) >= self.tile_aspect
+
+    def tiles(self, img_shape: tuple) -> list[tuple[int, int, int, int]]:
+        h, w = img_shape[:2]
+        # Узкая полоса режется только по длине: окно на всю ширину, чтобы не резать пузыри поперек
+        tile_w = w if h > w and w <= 2 * self.tile_size else self.tile_size
+        tile_h = h if w > h and h <= 2 * self.tile_size else self.tile_size
+        overlap = min(self.tile_overlap, self.tile_size // 2)
+        return [(x1, y1, x2, y2)
+                for y1, y2 in _axis_windows(h, tile_h, overlap)
+                for x1, x2 in _axis_windows(w, tile_w, overlap)]
+
+    def detect_tiled(self, img: np.ndarray) -> np.ndarray:
+        windows = self.tiles(img.shape)
+        self.metrics.observe("detect_tiles", len(windows))
+        all_boxes, all_scores, all_windows = [], [], []
+        for start in range(0, len(windows), self.tile_batch_size):
+            chunk = windows[start:start + self.tile_batch_size]
+            # Копируется только текущее окно, а не вся полоса
+            crops = [np.ascontiguousarray(img[y1:y2, x1:x2]) for x1, y1, x2, y2 in chunk]
+            with self.metrics.stage("detect"):
+                predictions = self.model(crops, conf=self.conf_threshold, verbose=False)
+            for window, result in zip(chunk, predictions):
+                boxes, scores = self._result_boxes(result)
+                x1, y1 = window[:2]
+                all_boxes.append(boxes + np.array([x1, y1, x1, y1], dtype=boxes.dtype))
+                all_scores.append(scores)
+                all_windows.append(np.tile(np.array(window, dtype=np.int32), (len(boxes), 1)))
+            del crops
+
+        boxes = np.concatenate(all_boxes) if all_boxes else np.zeros((0, 4), dtype=np.float32)
+        scores = np.concatenate(all_scores) if all_scores else np.zeros(0, dtype=np.float32)
+        box_windows = np.concatenate(all_windows) if all_windows else np.zeros((0, 4), dtype=np.int32)
+        merged, merged_scores = merge_seams(boxes, scores, box_windows, img.shape)
+        bboxes = self._finalize(merged, merged_scores, img.shape)
+        logger.debug(f"Тайловая детекция: {len(windows)} окон, {len(boxes)} рамок, после слияния {len(bboxes)}")
+        return bboxes
+
+    def detect(self, image_path: str) -> Tuple[np.ndarray, np.ndarray]:
         img = cv2.imread(image_path)
         if img is None:
             raise ValueError(f"Не удалось загрузить изображение: {image_path}")
+        return img, self.detect_array(img)
 
-        results = self.model(img, conf=self.conf_threshold)
-        bboxes = []
+    def detect_array(self, img: np.ndarray) -> np.ndarray:
+        if self.needs_tiling(img.shape):
+            bboxes = self.detect_tiled(img)
+            logger.info(f"Обнаружено {len(bboxes)} пузырей")
+            return bboxes
 
-        for r in results:
-            for box in r.boxes:
-                if box.conf.item() < self.conf_threshold:
-                    continue
-
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-                padding = 5
-                h, w = img.shape[:2]
-                x1 = max(0, x1 - padding)
-                y1 = max(0, y1 - padding)
-                x2 = min(w, x2 + padding)
-                y2 = min(h, y2 + padding)
-
-                bboxes.append((x1, y1, x2, y2))
+        with self.metrics.stage("detect"):
+            result = self.model(img, conf=self.conf_threshold)[0]
+        bboxes = self._extract_bboxes(result, img.shape)
 
         logger.info(f"Обнаружено {len(bboxes)} пузырей")
-        return img, bboxes
+        return bboxes
+
+    @staticmethod
+    def _decoded_nbytes(path) -> int:
+        # Размер берется из заголовка файла, пиксели при этом не декодируются
+        try:
+            with Image.open(path) as header:
+                width, height = header.size
+        except Exception:
+            return 0
+        return width * height * 3
 
-    def detect_batch(self, image_paths: List[str]):
-        results = []
+    def _decode_chunks(self, image_paths: List[str], batch_size: int, max_bytes: int | None):
+        chunk, chunk_bytes = [], 0
         for path in image_paths:
+            nbytes = self._decoded_nbytes(path) if max_bytes else 0
+            if chunk and (len(chunk) >= batch_size or (max_bytes and chunk_bytes + nbytes > max_bytes)):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(path)
+            chunk_bytes += nbytes
+        if chunk:
+            yield chunk
+
+    def iter_detect_batch(self, image_paths: List[str], batch_size: int = 8, num_workers: int = 4,
+                          max_bytes: int | None = None):
+        def _read(path):
+            img = cv2.imread(str(path))
+            if img is None:
+                logger.error(f"Не удалось загрузить изображение: {path}")
+            return path, img
+
+        # Пакет декодирования ограничен и числом страниц, и объемом пикселей: восемь длинных полос
+        # вебтуна заняли бы сотни мегабайт еще до детекции
+        batch_size = max(1, batch_size)
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+            for paths in self._decode_chunks(image_paths, batch_size, max_bytes):
+                with self.metrics.stage("decode"):
+                    chunk = [(path, img) for path, img in executor.map(_read, paths) if img is not None]
+                if not chunk:
+                    continue
+
+                page_bboxes = self.detect_images([img for _, img in chunk])
+                for (path, img), bboxes in zip(chunk, page_bboxes):
+                    if bboxes is None:
+                        logger.error(f"Ошибка детекции на изображении {path}")
+                        continue
+                    yield path, img, bboxes
+
+    def detect_images(self, images: List[np.ndarray]) -> List[np.ndarray | None]:
+        if not images:
+            return []
+        results: list = [None] * len(images)
+        tiled = [i for i, img in enumerate(images) if self.needs_tiling(img.shape)]
+        for i in tiled:
             try:
-                img, bboxes = self.detect(path)
-                results.append((path, img, bboxes))
+                results[i] = self.detect_tiled(images[i])
             except Exception as e:
-                logger.error(f"Ошибка при обработке {path}: {e}")
-                continue
+                logger.error(f"Ошибка тайловой детекции: {e}")
+
+        tiled_set = set(tiled)
+        regular = [i for i in range(len(images)) if i not in tiled_set]
+        if not regular:
+            return results
+        self.metrics.observe("detect_batch_size", len(regular))
+        try:
+            with self.metrics.stage("detect"):
+                predictions = self.model([images[i] for i in regular], conf=self.conf_threshold, verbose=False)
+        except Exception as e:
+            logger.error(f"Ошибка пакетной детекции, переход к постраничной: {e}")
+            predictions = []
+            for i in regular:
+                try:
+                    predictions.append(self.model(images[i], conf=self.conf_threshold, verbose=False)[0])
+                except Exception as page_error:
+                    logger.error(f"Ошибка детекции: {page_error}")
+                    predictions.append(None)
+
+        for i, r in zip(regular, predictions):
+            results[i] = None if r is None else self._extract_bboxes(r, images[i].shape)
+        return results
+
+    def detect_batch(self, image_paths: List[str], batch_size: int = 8, num_workers: int = 4,
+                     max_bytes: int | None = None):
+        results = list(self.iter_detect_batch(image_paths, batch_size, num_workers, max_bytes))
+        logger.info(f"Пакетная детекция завершена: {len(results)}/{len(image_paths)} изображений")
         return results
@@ -0,0 +1,25 @@
+import cv2
+import numpy as np
+
+
+CONTENT_TYPES = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+
+def decode_image(data: bytes) -> np.ndarray | None:
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def encode_image(img: np.ndarray, fmt: str = "jpg", quality: int = 95) -> bytes:
+    fmt = fmt.lower().lstrip(".")
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Неподдерживаемый формат: {fmt}")
+
+    params = []
+    if fmt in ("jpg", "jpeg"):
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif fmt == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    ok, buffer = cv2.imencode(f".{fmt}", img, params)
+    if not ok:
+        raise ValueError(f"Не удалось закодировать изображение в {fmt}")
+    return buffer.tobytes()
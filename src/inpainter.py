@@ -1,5 +1,5 @@
 import logging
-import textwrap
+import string
 from typing import Tuple
 
 import cv2
@@ -9,11 +9,16 @@ from PIL import Image, ImageDraw, ImageFont
 
 logger = logging.getLogger(__name__)
 
+_REFERENCE_FONT_SIZE = 100
+_PRECOMPUTED_GLYPHS = string.printable + "".join(chr(c) for c in range(0x0400, 0x0460)) + "«»—–…"
+
 
 class TextInpainter:
     def __init__(self, selected_font: str, font_dir: str):
         self.fonts = {}
         self.selected_font = selected_font
+        self._font_cache: dict[tuple[str, int], ImageFont.FreeTypeFont] = {}
+        self._advances: dict[str, dict[str, float]] = {}
         self._load_fonts(font_dir)
 
     def _load_fonts(self, font_dir: str):
@@ -28,14 +33,19 @@ class TextInpainter:
                 except Exception as e:
                     logger.warning(f"Не удалось загрузить шрифт {fname}: {e}")
 
-    def remove_text(self, image: np.ndarray) -> np.ndarray:
+    @staticmethod
+    def _largest_contour(thresh: np.ndarray) -> np.ndarray | None:
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return None
+        return max(contours, key=cv2.contourArea)
+
+    def remove_text(self, image: np.ndarray) -> tuple[np.ndarray, np.ndarray | None]:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         _, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        largest_contour = max(contours, key=cv2.contourArea)
-        mask = np.zeros_like(gray)
-        cv2.drawContours(mask, [largest_contour], -1, 255, cv2.FILLED)
-        image[mask == 255] = (255, 255, 255)
+        largest_contour = self._largest_contour(thresh)
+        if largest_contour is not None:
+            cv2.drawContours(image, [largest_contour], -1, (255, 255, 255), cv2.FILLED)
         # Использование KMeans для заполнения фона
         # from sklearn.cluster import KMeans
         # kmeans = KMeans(n_clusters=2, random_state=42, n_init=10)
@@ -44,38 +54,117 @@ class TextInpainter:
         # color = kmeans.cluster_centers_[labels[np.argmax(counts)]].astype(int)
         return image, largest_contour
 
-    def calculate_font_size(self, text: str, bbox_size: Tuple[int, int],
-                           max_font_size: int = 36, min_font_size: int = 7) -> Tuple[ImageFont.FreeTypeFont, list]:
-        width, height = bbox_size
+    def remove_text_page(self, page: np.ndarray, bboxes: list[tuple[int, int, int, int]]) -> list[np.ndarray | None]:
+        if len(bboxes) == 0:
+            return []
 
-        for font_size in range(max_font_size, min_font_size, -1):
-            try:
-                font = ImageFont.truetype(self.fonts[self.selected_font], font_size)
-
-                avg_char_width = font_size * 0.9
-                max_chars_per_line = int(width / avg_char_width)
-                if max_chars_per_line <= 0:
-                    continue
-
-                lines = textwrap.wrap(text, width=max_chars_per_line, break_long_words=True)
-                line_height = font_size * 1.2
-                total_height = len(lines) * line_height
-
-                if total_height < height * 0.9:
-                    return font, lines
-            except Exception:
+        # Одна конвертация и пороговая обработка на всю страницу, заливка идет прямо в page
+        gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+        _, thresh = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
+        del gray
+
+        contours = []
+        for x1, y1, x2, y2 in bboxes:
+            largest_contour = self._largest_contour(thresh[y1:y2, x1:x2])
+            if largest_contour is None:
+                logger.warning(f"Не найден контур пузыря в области {(x1, y1, x2, y2)}")
+            else:
+                cv2.drawContours(page, [largest_contour], -1, (255, 255, 255), cv2.FILLED, offset=(int(x1), int(y1)))
+            contours.append(largest_contour)
+        return contours
+
+    def get_font(self, size: int, font_path: str | None = None) -> ImageFont.FreeTypeFont:
+        font_path = font_path or self.fonts[self.selected_font]
+        key = (font_path, size)
+        font = self._font_cache.get(key)
+        if font is None:
+            font = ImageFont.truetype(font_path, size)
+            self._font_cache[key] = font
+        return font
+
+    def _glyph_advances(self, font_path: str) -> dict[str, float]:
+        advances = self._advances.get(font_path)
+        if advances is None:
+            font = self.get_font(_REFERENCE_FONT_SIZE, font_path)
+            advances = {ch: font.getlength(ch) for ch in _PRECOMPUTED_GLYPHS}
+            self._advances[font_path] = advances
+        return advances
+
+    def text_width(self, text: str, font_size: int) -> float:
+        font_path = self.fonts[self.selected_font]
+        advances = self._glyph_advances(font_path)
+        total = 0.0
+        for ch in text:
+            advance = advances.get(ch)
+            if advance is None:
+                advance = self.get_font(_REFERENCE_FONT_SIZE, font_path).getlength(ch)
+                advances[ch] = advance
+            total += advance
+        return total * font_size / _REFERENCE_FONT_SIZE
+
+    def wrap_text(self, text: str, font_size: int, max_width: float) -> list[str] | None:
+        space_width = self.text_width(" ", font_size)
+        lines, line, line_width = [], "", 0.0
+        for word in text.split():
+            word_width = self.text_width(word, font_size)
+            if word_width > max_width:
+                # Длинное слово разбивается по символам, как break_long_words в textwrap
+                if line:
+                    lines.append(line)
+                    line, line_width = "", 0.0
+                for ch in word:
+                    ch_width = self.text_width(ch, font_size)
+                    if ch_width > max_width:
+                        return None
+                    if line and line_width + ch_width > max_width:
+                        lines.append(line)
+                        line, line_width = "", 0.0
+                    line += ch
+                    line_width += ch_width
                 continue
 
-        font = ImageFont.truetype(self.fonts[self.selected_font], min_font_size)
-        lines = textwrap.wrap(text, width=20)
-        return font, lines
+            extra = space_width + word_width if line else word_width
+            if line and line_width + extra > max_width:
+                lines.append(line)
+                line, line_width = word, word_width
+            else:
+                line = f"{line} {word}" if line else word
+                line_width += extra
+        if line:
+            lines.append(line)
+        return lines
 
-    def draw_text(self, image: np.ndarray, largest_contour: np.ndarray, text: str) -> np.ndarray:
-        x, y, w, h = cv2.boundingRect(largest_contour)
+    def calculate_font_size(self, text: str, bbox_size: Tuple[int, int],
+                           max_font_size: int = 36, min_font_size: int = 7) -> Tuple[ImageFont.FreeTypeFont, list]:
+        width, height = bbox_size
 
-        pil_img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(pil_img)
+        def _fit(font_size: int) -> list[str] | None:
+            lines = self.wrap_text(text, font_size, width)
+            if not lines or len(lines) * font_size * 1.2 >= height * 0.9:
+                return None
+            return lines
+
+        # Бинарный поиск наибольшего размера, при котором текст помещается в пузырь
+        best_size, best_lines = None, None
+        low, high = min_font_size + 1, max_font_size
+        while low <= high:
+            font_size = (low + high) // 2
+            lines = _fit(font_size)
+            if lines is not None:
+                best_size, best_lines = font_size, lines
+                low = font_size + 1
+            else:
+                high = font_size - 1
+
+        if best_size is not None:
+            return self.get_font(best_size), best_lines
+
+        font = self.get_font(min_font_size)
+        lines = self.wrap_text(text, min_font_size, width) or [text]
+        return font, lines
 
+    def _draw_lines(self, draw: ImageDraw.ImageDraw, rect: Tuple[int, int, int, int], text: str):
+        x, y, w, h = rect
         font, lines = self.calculate_font_size(text, (w, h))
 
         line_height = font.size * 1.2
@@ -83,14 +172,40 @@ class TextInpainter:
 
         y_offset = y + (h - total_text_height) // 2
 
-        for _, line in enumerate(lines):
+        for line in lines:
             line_width = draw.textlength(line, font=font)
 
             x_offset = x + (w - line_width) // 2
 
-            for dx, dy in [(-1,-1), (-1,1), (1,-1), (1,1), (0,-1), (0,1), (-1,0), (1,0)]:
-                draw.text((x_offset+dx, y_offset+dy), line, font=font, fill=(255, 255, 255))
-            draw.text((x_offset, y_offset), line, font=font, fill=(0, 0, 0))
+            # Белая обводка рисуется вместе с текстом за один вызов
+            draw.text((x_offset, y_offset), line, font=font, fill=(0, 0, 0), stroke_width=1, stroke_fill=(255, 255, 255))
 
             y_offset += line_height
+
+    @staticmethod
+    def _text_rect(image_shape: tuple, largest_contour: np.ndarray | None) -> Tuple[int, int, int, int]:
+        if largest_contour is None:
+            return 0, 0, image_shape[1], image_shape[0]
+        return cv2.boundingRect(largest_contour)
+
+    def draw_text(self, image: np.ndarray, largest_contour: np.ndarray | None, text: str) -> np.ndarray:
+        pil_img = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        draw = ImageDraw.Draw(pil_img)
+        self._draw_lines(draw, self._text_rect(image.shape, largest_contour), text)
         return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+
+    def render_page(self, page: np.ndarray,
+                    bubbles: list[Tuple[Tuple[int, int, int, int], np.ndarray | None, str]]) -> np.ndarray:
+        bubbles = [bubble for bubble in bubbles if bubble[2]]
+        if not bubbles:
+            return page
+
+        # Страница конвертируется в PIL и обратно один раз на все пузыри
+        pil_img = Image.fromarray(cv2.cvtColor(page, cv2.COLOR_BGR2RGB))
+        draw = ImageDraw.Draw(pil_img)
+        for (x1, y1, x2, y2), largest_contour, text in bubbles:
+            x, y, w, h = self._text_rect((y2 - y1, x2 - x1), largest_contour)
+            self._draw_lines(draw, (x1 + x, y1 + y, w, h), text)
+
+        page[...] = cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2BGR)
+        return page
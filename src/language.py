@@ -0,0 +1,75 @@
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+from config.settings import settings
+
+
+def _script_counts(text: str) -> tuple[int, int, int]:
+    kana = kanji = latin = 0
+    for char in text:
+        code = ord(char)
+        if 0x3040 <= code <= 0x30FF or 0x31F0 <= code <= 0x31FF or 0xFF66 <= code <= 0xFF9F:
+            kana += 1
+        elif 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF:
+            kanji += 1
+        elif char.isalpha() and unicodedata.name(char, "").startswith("LATIN"):
+            latin += 1
+    return kana, kanji, latin
+
+
+def classify_script(text: str) -> str | None:
+    # Кана однозначно японская; кандзи без каны тоже считаем японским, китайский не поддерживается
+    kana, kanji, latin = _script_counts(text)
+    if kana or kanji > latin:
+        lang = "ja"
+    elif latin and not kanji:
+        lang = "en"
+    else:
+        return None
+    return lang if lang in settings.SUPPORTED_LANGUAGES else None
+
+
+@lru_cache(maxsize=4096)
+def _langdetect(text: str) -> str | None:
+    from langdetect import DetectorFactory, LangDetectException, detect
+
+    # Без фиксированного seed langdetect возвращает разные ответы на коротких строках
+    DetectorFactory.seed = 0
+    try:
+        lang = detect(text)
+    except LangDetectException:
+        return None
+    return lang if lang in settings.SUPPORTED_LANGUAGES else None
+
+
+def detect_language(text: str) -> str | None:
+    text = " ".join(text.split())
+    if not text:
+        return None
+    return classify_script(text) or _langdetect(text)
+
+
+def detect_languages(texts: list[str]) -> list[str | None]:
+    # Голосование по странице: неоднозначные реплики получают язык большинства,
+    # langdetect вызывается не больше одного раза и только если письменность не помогла ни разу
+    texts = [" ".join((text or "").split()) for text in texts]
+    langs = [classify_script(text) if text else None for text in texts]
+    votes = Counter()
+    for text, lang in zip(texts, langs):
+        if lang is not None:
+            votes[lang] += len(text)
+
+    ambiguous = [text for text, lang in zip(texts, langs) if text and lang is None]
+    if not ambiguous:
+        return langs
+    page_lang = votes.most_common(1)[0][0] if votes else _langdetect(" ".join(ambiguous))
+    return [lang or (page_lang if text else None) for text, lang in zip(texts, langs)]
+
+
+def detect_page_language(texts: list[str]) -> str | None:
+    votes = Counter()
+    for text, lang in zip(texts, detect_languages(texts)):
+        if lang is not None:
+            votes[lang] += len(text)
+    return votes.most_common(1)[0][0] if votes else None
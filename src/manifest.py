@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_hash(config: dict) -> str:
+    return hashlib.blake2b(json.dumps(config, sort_keys=True, default=str).encode(), digest_size=12).hexdigest()
+
+
+class JobManifest:
+    VERSION = 1
+
+    def __init__(self, path: Path, save_interval: float = 2.0):
+        self.path = Path(path)
+        self.save_interval = save_interval
+        self.pages: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+
+    @classmethod
+    def for_output_dir(cls, output_dir: Path) -> "JobManifest":
+        output_dir = Path(output_dir)
+        return cls.load(output_dir.parent / f"{output_dir.name}.manifest.json")
+
+    @classmethod
+    def load(cls, path: Path) -> "JobManifest":
+        manifest = cls(path)
+        if manifest.path.exists():
+            try:
+                data = json.loads(manifest.path.read_text(encoding="utf-8"))
+                if data.get("version") == cls.VERSION:
+                    manifest.pages = data.get("pages", {})
+                else:
+                    logger.warning(f"Версия манифеста {manifest.path} не поддерживается, он будет перезаписан")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Не удалось прочитать манифест {manifest.path}: {e}")
+        return manifest
+
+    def plan(self, name: str, input_hash: str, hashes: dict[str, str], output_exists: bool) -> str:
+        record = self.pages.get(name)
+        if (record is None or record.get("status") != "done" or record.get("input_hash") != input_hash
+                or record.get("ocr_hash") != hashes["ocr"] or record.get("bubbles") is None):
+            return "full"
+        if record.get("translate_hash") != hashes["translate"]:
+            return "translate"
+        if record.get("render_hash") != hashes["render"] or not output_exists:
+            return "render"
+        return "skip"
+
+    def bubbles(self, name: str) -> list[dict]:
+        return self.pages.get(name, {}).get("bubbles") or []
+
+    def record(self, name: str, input_hash: str | None, hashes: dict[str, str], bubbles: list[dict] | None):
+        with self._lock:
+            self.pages[name] = {
+                "input_hash": input_hash,
+                "status": "done" if bubbles is not None else "failed",
+                "ocr_hash": hashes["ocr"],
+                "translate_hash": hashes["translate"],
+                "render_hash": hashes["render"],
+                "bubbles": bubbles,
+                "updated_at": time.time(),
+            }
+            self._dirty = True
+            if time.monotonic() - self._last_save >= self.save_interval:
+                self._save_locked()
+
+    def save(self):
+        with self._lock:
+            if self._dirty:
+                self._save_locked()
+
+    def _save_locked(self):
+        # Атомарная запись: прерванный запуск не оставит поврежденный манифест
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps({"version": self.VERSION, "pages": self.pages}, ensure_ascii=False),
+                                encoding="utf-8")
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить манифест {self.path}: {e}")
@@ -0,0 +1,157 @@
+import cProfile
+import copy
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class PipelineMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers: dict[str, list[float]] = {}
+        self._counters: dict[str, float] = {}
+        self._observations: dict[str, list[float]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name: str, seconds: float):
+        with self._lock:
+            timer = self._timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            observation = self._observations.setdefault(name, [0, 0.0, 0.0])
+            observation[0] += 1
+            observation[1] += value
+            observation[2] = max(observation[2], value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "timers": copy.deepcopy(self._timers),
+                "counters": dict(self._counters),
+                "observations": copy.deepcopy(self._observations),
+            }
+
+    def diff(self, since: dict) -> dict:
+        current = self.snapshot()
+        for kind in ("timers", "observations"):
+            for name, values in current[kind].items():
+                before = since[kind].get(name)
+                if before is not None:
+                    values[0] -= before[0]
+                    values[1] -= before[1]
+            current[kind] = {name: values for name, values in current[kind].items() if values[0] > 0}
+        current["counters"] = {
+            name: value - since["counters"].get(name, 0)
+            for name, value in current["counters"].items()
+            if value != since["counters"].get(name, 0)
+        }
+        return current
+
+    def merge(self, raw: dict):
+        with self._lock:
+            for kind, target in (("timers", self._timers), ("observations", self._observations)):
+                for name, (count, total, maximum) in raw.get(kind, {}).items():
+                    values = target.setdefault(name, [0, 0.0, 0.0])
+                    values[0] += count
+                    values[1] += total
+                    values[2] = max(values[2], maximum)
+            for name, value in raw.get("counters", {}).items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    @staticmethod
+    def format_report(raw: dict) -> dict:
+        return {
+            "stages": {
+                name: {
+                    "count": int(count),
+                    "total_seconds": round(total, 4),
+                    "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                    "max_ms": round(maximum * 1000, 3),
+                }
+                for name, (count, total, maximum) in sorted(raw["timers"].items())
+            },
+            "counters": dict(sorted(raw["counters"].items())),
+            "distributions": {
+                name: {"count": int(count), "mean": round(total / count, 3) if count else 0.0, "max": maximum}
+                for name, (count, total, maximum) in sorted(raw["observations"].items())
+            },
+        }
+
+    def report(self, since: dict | None = None) -> dict:
+        return self.format_report(self.diff(since) if since is not None else self.snapshot())
+
+    def to_prometheus(self, prefix: str = "manga_translator") -> str:
+        raw = self.snapshot()
+        lines = [
+            f"# TYPE {prefix}_stage_seconds summary",
+            *(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {total:.6f}\n'
+              f'{prefix}_stage_seconds_count{{stage="{name}"}} {int(count)}'
+              for name, (count, total, _) in sorted(raw["timers"].items())),
+            f"# TYPE {prefix}_events_total counter",
+            *(f'{prefix}_events_total{{event="{name}"}} {value:g}' for name, value in sorted(raw["counters"].items())),
+            f"# TYPE {prefix}_observation summary",
+            *(f'{prefix}_observation_sum{{name="{name}"}} {total:g}\n'
+              f'{prefix}_observation_count{{name="{name}"}} {int(count)}'
+              for name, (count, total, _) in sorted(raw["observations"].items())),
+        ]
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self._observations.clear()
+
+
+class BatchProfiler:
+    def __init__(self):
+        self._profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def thread(self):
+        # cProfile видит только поток, в котором включен: каждый рабочий поток профилируется отдельно
+        profiler = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profiler)
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+
+    def dump(self, path: Path, top: int = 30):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            profiles = list(self._profiles)
+        pstats.Stats(*profiles).dump_stats(str(path))
+        with open(path.with_suffix(".txt"), "w", encoding="utf-8") as f:
+            pstats.Stats(str(path), stream=f).sort_stats("cumulative").print_stats(top)
+
+
+@contextmanager
+def profile_to(path: Path, top: int = 30):
+    profiler = BatchProfiler()
+    try:
+        with profiler.thread():
+            yield profiler
+    finally:
+        profiler.dump(path, top)
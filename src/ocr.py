@@ -5,33 +5,115 @@ import numpy as np
 from PIL import Image
 from loguru import logger
 
+from .cache import OCRCache
+from .registry import registry
+
 
 class TextRecognizer:
-    def __init__(self, languages: list[str], gpu: bool = False, ocr_type: Literal["manga", "doctr", "easy", "paddle"] = None):
-        if ocr_type == "manga":
+    def __init__(self, languages: list[str], gpu: bool = False, ocr_type: Literal["manga", "doctr", "easy", "paddle"] = None,
+                 batch_size: int = 16, cache: OCRCache | None = None):
+        if ocr_type not in ("manga", "doctr", "easy", "paddle"):
+            logger.error("OCR не инициализирован...")
+            raise ValueError("OCR не инициализирован")
+
+        self.ocr_type = ocr_type
+        self.languages = list(languages)
+        self.gpu = gpu
+        self.batch_size = max(1, batch_size)
+        self.cache = cache
+
+    @property
+    def model_key(self) -> tuple:
+        languages = tuple(self.languages) if self.ocr_type in ("easy", "paddle") else ()
+        return "ocr", self.ocr_type, languages, self.gpu
+
+    @property
+    def model(self):
+        return registry.get(self.model_key, self._load_model)
+
+    def _load_model(self):
+        if self.ocr_type == "manga":
             from manga_ocr import MangaOcr
-            self.model = MangaOcr()
-        elif ocr_type == "doctr":
+            return MangaOcr()
+        elif self.ocr_type == "doctr":
             from doctr.models import ocr_predictor
-            self.model = ocr_predictor(pretrained=True)
-        elif ocr_type == "easy":
+            return ocr_predictor(pretrained=True)
+        elif self.ocr_type == "easy":
             import easyocr
-            self.model = easyocr.Reader(languages, gpu=gpu)
-        elif ocr_type == "paddle":
-            from paddleocr import PaddleOCR
-            self.model = PaddleOCR(
-                lang=languages[0],
-                text_recognition_model_name="PP-OCRv5_mobile_rec",
-                use_doc_orientation_classify=False,
-                use_doc_unwarping=False,
-                use_textline_orientation=False,
-            )
+            return easyocr.Reader(self.languages, gpu=self.gpu)
+        from paddleocr import PaddleOCR
+        return PaddleOCR(
+            lang=self.languages[0],
+            text_recognition_model_name="PP-OCRv5_mobile_rec",
+            use_doc_orientation_classify=False,
+            use_doc_unwarping=False,
+            use_textline_orientation=False,
+        )
+
+    def recognize(self, image: np.ndarray) -> str | None:
+        return self.recognize_batch([image])[0]
+
+    def _recognize_uncached(self, image: np.ndarray) -> str | None:
+        if self.ocr_type == "manga":
+            return self.recognize_mangaocr(image)
+        elif self.ocr_type == "doctr":
+            return self.recognize_doctr(image)
+        elif self.ocr_type == "easy":
+            return self.recognize_easyocr(image)
+        elif self.ocr_type == "paddle":
+            return self.recognize_paddle(image)
+        logger.warning("Этот тип OCR не поддерживается...")
+        return None
+
+    def recognize_batch(self, images: list[np.ndarray]) -> list[str | None]:
+        if not images:
+            return []
+        if self.cache is None:
+            return self._recognize_batch_uncached(images)
+
+        # Текст easy/paddle зависит от языков модели, поэтому они входят в ключ кэша вместе с типом OCR
+        _, ocr_type, languages, _ = self.model_key
+        namespace = "+".join((ocr_type, *languages))
+        keys = [OCRCache.make_key(image, namespace) for image in images]
+        cached = self.cache.get_many(list(dict.fromkeys(keys)))
+        pending = {}
+        for key, image in zip(keys, images):
+            if key not in cached and key not in pending:
+                pending[key] = image
+
+        if pending:
+            recognized = dict(zip(pending, self._recognize_batch_uncached(list(pending.values()))))
+            self.cache.set_many({key: text for key, text in recognized.items() if text is not None})
+            cached.update(recognized)
+        logger.debug(f"OCR кэш: {len(images) - len(pending)}/{len(images)} фрагментов из кэша")
+        return [cached.get(key) for key in keys]
+
+    def _recognize_batch_uncached(self, images: list[np.ndarray]) -> list[str | None]:
+        if self.ocr_type == "manga":
+            recognize_chunk = self.recognize_mangaocr_batch
+        elif self.ocr_type == "doctr":
+            recognize_chunk = self.recognize_doctr_batch
+        elif self.ocr_type == "easy":
+            recognize_chunk = self.recognize_easyocr_batch
+        elif self.ocr_type == "paddle":
+            recognize_chunk = self.recognize_paddle_batch
         else:
-            logger.error("OCR не инициализирован...")
-            raise ValueError("OCR не инициализирован")
+            logger.warning("Этот тип OCR не поддерживается...")
+            return [None] * len(images)
 
-    def recognize_paddle(self, image: np.ndarray) -> str:
-        result = self.model.predict(image)
+        texts = []
+        for start in range(0, len(images), self.batch_size):
+            chunk = images[start:start + self.batch_size]
+            try:
+                texts.extend(recognize_chunk(chunk))
+            except Exception as e:
+                logger.error(f"Ошибка пакетного OCR, переход к поштучному: {e}")
+                texts.extend(self._recognize_uncached(image) for image in chunk)
+        logger.debug(f"Пакетный OCR: распознано {len(texts)} фрагментов")
+        return texts
+
+    @staticmethod
+    def _paddle_texts(result) -> str:
         if isinstance(result, list) and len(result) > 0 and isinstance(result[0], dict) and "rec_texts" in result[0]:
             result = result[0]
 
@@ -42,46 +124,74 @@ class TextRecognizer:
                 texts.append(text)
         return " ".join(texts).lower()
 
+    def recognize_paddle(self, image: np.ndarray) -> str:
+        return self._paddle_texts(self.model.predict(image))
+
+    def recognize_paddle_batch(self, images: list[np.ndarray]) -> list[str]:
+        results = list(self.model.predict(list(images)))
+        if len(results) != len(images):
+            raise ValueError(f"PaddleOCR вернул {len(results)} результатов для {len(images)} изображений")
+        return [self._paddle_texts(result) for result in results]
+
+    @staticmethod
+    def _doctr_texts(page) -> str:
+        texts = []
+        for block in page.blocks:
+            for line in block.lines:
+                for word in line.words:
+                    if hasattr(word, "value"):
+                        texts.append(word.value)
+        return " ".join(texts).strip().lower()
+
     def recognize_doctr(self, image: np.ndarray) -> str:
         if len(image.shape) == 3:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
         result = self.model([image])
-        texts = []
-        for page in result.pages:
-            for block in page.blocks:
-                for line in block.lines:
-                    for word in line.words:
-                        if hasattr(word, "value"):
-                            texts.append(word.value)
-
-        text = " ".join(texts).strip().lower()
+        text = " ".join(self._doctr_texts(page) for page in result.pages).strip()
         logger.debug(f"Doctr распознал: {text}...")
         return text
 
-    def recognize_mangaocr(self, image: np.ndarray) -> str:
+    def recognize_doctr_batch(self, images: list[np.ndarray]) -> list[str]:
+        rgb_images = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if len(image.shape) == 3 else image for image in images]
+        result = self.model(rgb_images)
+        return [self._doctr_texts(page) for page in result.pages]
+
+    @staticmethod
+    def _to_pil(image: np.ndarray) -> Image.Image:
         if isinstance(image, np.ndarray):
             if len(image.shape) == 3:
                 if image.shape[2] == 3:
-                    pil_image = Image.fromarray(image)
-                else:
-                    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                    pil_image = Image.fromarray(rgb_image)
-            else:
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-                pil_image = Image.fromarray(rgb_image)
-        else:
-            pil_image = image
-        text = self.model(pil_image)
+                    return Image.fromarray(image)
+                return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_GRAY2RGB))
+        return image
+
+    def recognize_mangaocr(self, image: np.ndarray) -> str:
+        text = self.model(self._to_pil(image))
         logger.debug(f"Manga OCR распознал: {text}...")
         return text
 
+    def recognize_mangaocr_batch(self, images: list[np.ndarray]) -> list[str]:
+        import torch
+        from manga_ocr.ocr import post_process
+
+        # MangaOcr принимает одно изображение за вызов, поэтому батч собирается
+        # напрямую через его процессор и VisionEncoderDecoder модель
+        model = self.model
+        processor = getattr(model, "processor", None) or getattr(model, "feature_extractor")
+        pil_images = [self._to_pil(image).convert("L").convert("RGB") for image in images]
+        pixel_values = processor(pil_images, return_tensors="pt").pixel_values
+        with torch.inference_mode():
+            outputs = model.model.generate(pixel_values.to(model.model.device), max_length=300)
+        return [post_process(model.tokenizer.decode(output.cpu(), skip_special_tokens=True)) for output in outputs]
+
     def recognize_easyocr(self, image: np.ndarray) -> str:
         if len(image.shape) == 3:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
         try:
-            results = self.reader.readtext(image, detail=0, paragraph=True)
+            results = self.model.readtext(image, detail=0, paragraph=True)
             if results:
                 text = " ".join(results).strip()
                 logger.debug(f"Easy OCR распознал: {text}...")
@@ -91,9 +201,48 @@ class TextRecognizer:
             logger.error(f"Ошибка OCR: {e}")
             return ""
 
+    @staticmethod
+    def _pack_by_size(images: list[np.ndarray], max_padding_ratio: float = 1.5) -> list[list[int]]:
+        # Группируем фрагменты близкого размера, чтобы паддинг до общего размера был минимальным
+        order = sorted(range(len(images)), key=lambda i: images[i].shape[:2])
+        groups, bounds = [], []
+        for idx in order:
+            h, w = images[idx].shape[:2]
+            if groups:
+                min_h, min_w, max_w = bounds[-1]
+                new_min_w, new_max_w = min(min_w, w), max(max_w, w)
+                if h <= min_h * max_padding_ratio and new_max_w <= new_min_w * max_padding_ratio:
+                    groups[-1].append(idx)
+                    bounds[-1] = (min_h, new_min_w, new_max_w)
+                    continue
+            groups.append([idx])
+            bounds.append((h, w, w))
+        return groups
+
+    def recognize_easyocr_batch(self, images: list[np.ndarray]) -> list[str]:
+        texts = [""] * len(images)
+        rgb_images = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if len(image.shape) == 3 else image for image in images]
+        for group in self._pack_by_size(rgb_images):
+            if len(group) == 1:
+                texts[group[0]] = self.recognize_easyocr(images[group[0]])
+                continue
+
+            max_h = max(rgb_images[i].shape[0] for i in group)
+            max_w = max(rgb_images[i].shape[1] for i in group)
+            padded = []
+            for i in group:
+                img = rgb_images[i]
+                pad_h, pad_w = max_h - img.shape[0], max_w - img.shape[1]
+                padded.append(cv2.copyMakeBorder(img, 0, pad_h, 0, pad_w, cv2.BORDER_CONSTANT, value=(255, 255, 255)))
+
+            results = self.model.readtext_batched(padded, detail=0, paragraph=True)
+            for i, result in zip(group, results):
+                texts[i] = " ".join(result).strip() if result else ""
+        return texts
+
     def recognize_with_confidence(self, image: np.ndarray, confidence_threshold: float = 0.5):
         try:
-            results = self.reader.readtext(image)
+            results = self.model.readtext(image)
             texts = []
             for (bbox, text, prob) in results:
                 if prob >= confidence_threshold:
@@ -0,0 +1,97 @@
+import platform
+import shutil
+from pathlib import Path
+
+from loguru import logger
+
+
+ENCODER = "encoder_model"
+DECODER = "decoder_model"
+DECODER_WITH_PAST = "decoder_with_past_model"
+
+
+class OnnxMarianTranslator:
+    def __init__(self, model_name: str, cache_dir: Path, num_beams: int = 4, max_length: int = 512):
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Для ONNX движка перевода необходим optimum: uv pip install 'optimum[onnxruntime]'") from e
+
+        self.model_name = model_name
+        self.export_dir = Path(cache_dir) / model_name.replace("/", "__")
+        self.num_beams = max(1, num_beams)
+        self.max_length = max_length
+        self.model, self.tokenizer = self._load()
+
+    @property
+    def quantized_dir(self) -> Path:
+        return self.export_dir / "int8"
+
+    def _is_exported(self) -> bool:
+        return all((self.quantized_dir / f"{name}_quantized.onnx").exists() for name in (ENCODER, DECODER))
+
+    def _export(self):
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        fp32_dir = self.export_dir / "fp32"
+        logger.info(f"Экспорт {self.model_name} в ONNX: {fp32_dir}")
+        ORTModelForSeq2SeqLM.from_pretrained(self.model_name, export=True).save_pretrained(fp32_dir)
+        AutoTokenizer.from_pretrained(self.model_name).save_pretrained(fp32_dir)
+
+        # Динамическая int8 квантизация: веса в int8, активации квантуются на лету, калибровка не нужна
+        if platform.machine().lower() in ("arm64", "aarch64"):
+            qconfig = AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+        else:
+            qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        tmp_dir = self.export_dir / "int8.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for onnx_file in sorted(fp32_dir.glob("*.onnx")):
+            quantizer = ORTQuantizer.from_pretrained(fp32_dir, file_name=onnx_file.name)
+            quantizer.quantize(save_dir=tmp_dir, quantization_config=qconfig)
+        for extra in fp32_dir.iterdir():
+            if extra.suffix != ".onnx" and not (tmp_dir / extra.name).exists():
+                shutil.copy2(extra, tmp_dir / extra.name)
+
+        # Каталог появляется целиком, прерванный экспорт не будет принят за готовый
+        shutil.rmtree(self.quantized_dir, ignore_errors=True)
+        tmp_dir.rename(self.quantized_dir)
+        shutil.rmtree(fp32_dir, ignore_errors=True)
+        logger.info(f"Квантованная модель сохранена: {self.quantized_dir}")
+
+    def _load(self):
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        from transformers import AutoTokenizer
+
+        if not self._is_exported():
+            self._export()
+        else:
+            logger.info(f"Используется ранее экспортированная модель {self.quantized_dir}")
+
+        use_cache = (self.quantized_dir / f"{DECODER_WITH_PAST}_quantized.onnx").exists()
+        model = ORTModelForSeq2SeqLM.from_pretrained(
+            self.quantized_dir,
+            encoder_file_name=f"{ENCODER}_quantized.onnx",
+            decoder_file_name=f"{DECODER}_quantized.onnx",
+            decoder_with_past_file_name=f"{DECODER_WITH_PAST}_quantized.onnx" if use_cache else None,
+            use_cache=use_cache,
+            provider="CPUExecutionProvider",
+        )
+        return model, AutoTokenizer.from_pretrained(self.quantized_dir)
+
+    def translate(self, texts: list[str], batch_size: int = 16) -> list[str]:
+        translated = []
+        for start in range(0, len(texts), max(1, batch_size)):
+            chunk = texts[start:start + max(1, batch_size)]
+            inputs = self.tokenizer(chunk, return_tensors="pt", padding=True, truncation=True,
+                                    max_length=self.max_length)
+            outputs = self.model.generate(**inputs, num_beams=self.num_beams, max_length=self.max_length)
+            translated.extend(self.tokenizer.batch_decode(outputs, skip_special_tokens=True))
+        return translated
+
+    def __call__(self, texts: list[str] | str, batch_size: int = 16, **kwargs) -> list[dict]:
+        # Тот же формат ответа, что у transformers.pipeline("translation")
+        if isinstance(texts, str):
+            texts = [texts]
+        return [{"translation_text": text} for text in self.translate(list(texts), batch_size)]
@@ -0,0 +1,56 @@
+import re
+
+import numpy as np
+
+
+RIGHT_TO_LEFT_LANGUAGES = {"ja"}
+
+
+def reading_order(bboxes: np.ndarray, lang: str | None, row_overlap: float = 0.5) -> list[int]:
+    boxes = np.asarray(bboxes).reshape(-1, 4).tolist()
+    rows = []
+    for i in sorted(range(len(boxes)), key=lambda i: boxes[i][1]):
+        _, y1, _, y2 = boxes[i]
+        if rows:
+            top, bottom, members = rows[-1]
+            # Пузыри одного ряда заметно перекрываются по вертикали
+            overlap = min(bottom, y2) - max(top, y1)
+            if overlap >= row_overlap * max(1, min(bottom - top, y2 - y1)):
+                rows[-1] = (top, max(bottom, y2), members + [i])
+                continue
+        rows.append((y1, y2, [i]))
+
+    # Манга читается справа налево, остальное слева направо; ряды всегда сверху вниз
+    right_to_left = lang in RIGHT_TO_LEFT_LANGUAGES
+    order = []
+    for _, _, members in rows:
+        order.extend(sorted(members, key=lambda i: boxes[i][0] + boxes[i][2], reverse=right_to_left))
+    return order
+
+
+def pack_texts(texts: list[str], max_chars: int, delimiter: str) -> list[list[int]]:
+    packs, current, length = [], [], 0
+    for i, text in enumerate(texts):
+        added = len(text) + (len(delimiter) if current else 0)
+        if current and length + added > max_chars:
+            packs.append(current)
+            current, length = [], 0
+            added = len(text)
+        current.append(i)
+        length += added
+    if current:
+        packs.append(current)
+    return packs
+
+
+def split_translation(text: str, delimiter: str, expected: int) -> list[str] | None:
+    marker = delimiter.strip()
+    if marker:
+        # Переводчик может добавить или убрать пробелы внутри разделителя
+        pattern = r"\s*" + r"\s*".join(re.escape(char) for char in marker) + r"\s*"
+    else:
+        pattern = r"\s*\n\s*"
+    parts = [part.strip() for part in re.split(pattern, text.strip())]
+    if len(parts) != expected or not all(parts):
+        return None
+    return parts
@@ -1,5 +1,10 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Literal
+from typing import Callable, Iterable, Literal
 
 import cv2
 import numpy as np
@@ -8,12 +13,30 @@ from tqdm import tqdm
 
 from config.settings import settings
 
+from .archive import ChapterArchive
+from .cache import OCRCache, TranslationCache
 from .detector import BubbleDetector
+from .image_io import decode_image, encode_image
 from .inpainter import TextInpainter
+from .manifest import JobManifest, config_hash, file_hash
+from .metrics import PipelineMetrics, profile_to
 from .ocr import TextRecognizer
+from .page_text import reading_order
+from .streaming import StagedPipeline
 from .translator import MultiLanguageTranslator
 
 
+def _chunked(iterable, size: int):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= max(1, size):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 class MangaTranslatorPipeline:
     def __init__(self, yolo_model_path: str = None,
                  source_lang: str = None,
@@ -21,67 +44,274 @@ class MangaTranslatorPipeline:
                  ocr_type: Literal["manga", "doctr", "easy", "paddle"] = None,
                  translator_type: Literal["google", "transformers"] = None):
         model_path = yolo_model_path or settings.YOLO_MODEL_PATH
+        self.config = {
+            "yolo_model_path": str(model_path),
+            "source_lang": source_lang,
+            "selected_font": selected_font,
+            "ocr_type": ocr_type,
+            "translator_type": translator_type,
+        }
         self.ocr_type = ocr_type
-        self.detector = BubbleDetector(str(model_path))
-        self.ocr = TextRecognizer([source_lang] if source_lang else settings.SUPPORTED_LANGUAGES, settings.OCR_GPU, ocr_type)
-        self.translator = MultiLanguageTranslator(translator_type)
+        self.metrics = PipelineMetrics()
+        self.detector = BubbleDetector(
+            str(model_path),
+            metrics=self.metrics,
+            tile_size=settings.DETECT_TILE_SIZE if settings.DETECT_TILED else None,
+            tile_overlap=settings.DETECT_TILE_OVERLAP,
+            tile_aspect=settings.DETECT_TILE_ASPECT,
+            tile_max_side=settings.DETECT_TILE_MAX_SIDE,
+            merge_iou=settings.DETECT_MERGE_IOU,
+            tile_batch_size=settings.DETECT_TILE_BATCH_SIZE,
+        )
+        ocr_cache = None
+        if settings.OCR_CACHE_ENABLED:
+            ocr_cache = OCRCache(settings.OCR_CACHE_SIZE, settings.OCR_CACHE_PATH if settings.OCR_CACHE_DISK else None)
+        self.ocr = TextRecognizer([source_lang] if source_lang else settings.SUPPORTED_LANGUAGES, settings.OCR_GPU, ocr_type,
+                                  batch_size=settings.OCR_BATCH_SIZE, cache=ocr_cache)
+        translation_cache = None
+        if settings.TRANSLATION_CACHE_ENABLED:
+            translation_cache = TranslationCache(settings.TRANSLATION_CACHE_PATH, settings.TRANSLATION_CACHE_SIZE)
+        self.translator = MultiLanguageTranslator(translator_type, cache=translation_cache)
         self.inpainter = TextInpainter(selected_font, str(settings.FONT_DIR))
 
         self.source_lang = source_lang
+        self.detect_batch_size = settings.DETECT_BATCH_SIZE
+        self.decode_workers = settings.DECODE_WORKERS
+        self.decode_max_bytes = settings.DECODE_MEMORY_MB * 1024 * 1024
+        self.render_band_height = settings.RENDER_BAND_HEIGHT
         logger.info("Пайплайн инициализирован")
 
-    def process_single_bubble(self, image: np.ndarray, bbox: tuple[int, int, int, int]) -> np.ndarray:
+    def prometheus_metrics(self, prefix: str = "manga_translator") -> str:
+        lines = [f"# TYPE {prefix}_cache gauge"]
+        for cache_name, stats in self.cache_stats().items():
+            for key, value in stats.items():
+                lines.append(f'{prefix}_cache{{cache="{cache_name}",stat="{key}"}} {value}')
+        return self.metrics.to_prometheus(prefix) + "\n".join(lines) + "\n"
+
+    def preload(self):
+        _ = self.detector.model
+        _ = self.ocr.model
+        if self.translator.translator_type == "transformers":
+            for lang in [self.source_lang] if self.source_lang else settings.SUPPORTED_LANGUAGES:
+                if lang in settings.TRANSLATION_MODELS:
+                    self.translator.get_model(lang)
+
+    def cache_stats(self) -> dict:
+        stats = {}
+        if self.ocr.cache is not None:
+            stats["ocr"] = self.ocr.cache.stats()
+        if self.translator.cache is not None:
+            stats["translation"] = self.translator.cache.stats()
+        return stats
+
+    def recognize_pages(self, pages: list[tuple[np.ndarray, np.ndarray]]) -> list[list[str | None]]:
+        crops = [img[y1:y2, x1:x2] for img, bboxes in pages for x1, y1, x2, y2 in bboxes]
+        for _, bboxes in pages:
+            self.metrics.observe("bubbles_per_page", len(bboxes))
+        if crops:
+            self.metrics.observe("ocr_batch_size", len(crops))
+        with self.metrics.stage("ocr"):
+            texts = self.ocr.recognize_batch(crops)
+
+        page_texts, start = [], 0
+        for _, bboxes in pages:
+            page_texts.append(texts[start:start + len(bboxes)])
+            start += len(bboxes)
+        return page_texts
+
+    def process_single_bubble(self, image: np.ndarray, bbox: tuple[int, int, int, int], text: str | None = None,
+                              translated: str | None = None) -> np.ndarray:
         x1, y1, x2, y2 = bbox
         crop = image[y1:y2, x1:x2].copy()
-        if self.ocr_type == "manga":
-            text = self.ocr.recognize_mangaocr(crop)
-        elif self.ocr_type == "doctr":
-            text = self.ocr.recognize_doctr(crop)
-        elif self.ocr_type == "easy":
-            text = self.ocr.recognize_easyocr(crop)
-        elif self.ocr_type == "paddle":
-            text = self.ocr.recognize_paddle(crop)
-        else:
-            logger.warning("Этот тип OCR не поддерживается...")
-            text = None
+        if text is None:
+            text = self.ocr.recognize(crop)
 
         if text:
-            translated = self.translator.translate(text, self.source_lang)
+            if translated is None:
+                translated = self.translator.translate(text, self.source_lang)
             cleaned, largest_contour = self.inpainter.remove_text(crop)
             final_crop = self.inpainter.draw_text(cleaned, largest_contour, translated)
             image[y1:y2, x1:x2] = final_crop
         return image
 
+    def render_bubbles(self, img: np.ndarray, bboxes: np.ndarray, texts: list[str | None],
+                       translations: list[str], show_progress: bool = False) -> np.ndarray:
+        boxes = np.asarray(bboxes).reshape(-1, 4).tolist()
+        active = [(tuple(bbox), translated) for bbox, text, translated in zip(boxes, texts, translations) if text]
+        if show_progress:
+            logger.info(f"Отрисовка {len(active)} пузырей")
+        if img.shape[0] <= self.render_band_height:
+            self._render_region(img, active)
+            return img
+
+        # Длинная полоса отрисовывается горизонтальными полосами-видами: конвертации страницы
+        # в оттенки серого и в PIL идут по полосе, а не по всему изображению
+        for top, bottom, band in _render_bands([bbox for bbox, _ in active], self.render_band_height):
+            shifted = []
+            for i in band:
+                (x1, y1, x2, y2), translated = active[i]
+                shifted.append(((x1, y1 - top, x2, y2 - top), translated))
+            self._render_region(img[top:bottom], shifted)
+        return img
+
+    def _render_region(self, region: np.ndarray, active: list[tuple[tuple[int, int, int, int], str]]):
+        with self.metrics.stage("remove_text"):
+            contours = self.inpainter.remove_text_page(region, [bbox for bbox, _ in active])
+        with self.metrics.stage("draw_text"):
+            self.inpainter.render_page(region, [(bbox, contour, translated)
+                                                for (bbox, translated), contour in zip(active, contours)])
+
+    def translate_texts(self, texts: list[str | None], bboxes: np.ndarray | None = None) -> list[str]:
+        self.metrics.observe("translate_batch_size", len(texts))
+        texts = [text or "" for text in texts]
+        with self.metrics.stage("translate"):
+            if bboxes is None or not settings.TRANSLATE_PACKING or len(texts) < 2:
+                return self.translator.translate_many(texts, self.source_lang)
+
+            # Порядок чтения задает язык страницы, а язык каждой реплики определяется отдельно при упаковке
+            order = reading_order(bboxes, self.source_lang or self.translator.detect_page_language(texts))
+            ordered = self.translator.translate_packed([texts[i] for i in order], self.source_lang)
+            translations = [""] * len(texts)
+            for i, translated in zip(order, ordered):
+                translations[i] = translated
+            return translations
+
+    def process_page(self, img: np.ndarray, bboxes: np.ndarray | None = None,
+                     texts: list[str | None] | None = None, translations: list[str] | None = None,
+                     show_progress: bool = False) -> tuple[np.ndarray, list[dict]]:
+        if bboxes is None:
+            bboxes = self.detector.detect_array(img)
+        if len(bboxes) == 0:
+            return img, []
+
+        if texts is None:
+            texts = self.recognize_pages([(img, bboxes)])[0]
+        if translations is None:
+            translations = self.translate_texts(texts, bboxes)
+        img = self.render_bubbles(img, bboxes, texts, translations, show_progress)
+        return img, _bubble_records(bboxes, texts, translations)
+
+    def process_array(self, img: np.ndarray, bboxes: np.ndarray | None = None,
+                      texts: list[str | None] | None = None, inplace: bool = False) -> np.ndarray:
+        if not inplace:
+            img = img.copy()
+        return self.process_page(img, bboxes, texts)[0]
+
+    def process_bytes(self, data: bytes, fmt: str = "jpg", quality: int = 95) -> bytes:
+        img = decode_image(data)
+        if img is None:
+            raise ValueError("Не удалось декодировать изображение")
+        img = self.process_array(img, inplace=True)
+        with self.metrics.stage("encode"):
+            return encode_image(img, fmt, quality)
+
+    def iter_process_bytes(self, items: Iterable[tuple[str, bytes]], fmt: str = "jpg", quality: int = 95):
+        with ThreadPoolExecutor(max_workers=max(1, self.decode_workers)) as executor:
+            for chunk in _chunked(items, self.detect_batch_size):
+                images = list(executor.map(lambda item: decode_image(item[1]), chunk))
+                decoded = [(name, img) for (name, _), img in zip(chunk, images) if img is not None]
+                for (name, _), img in zip(chunk, images):
+                    if img is None:
+                        logger.error(f"Не удалось декодировать изображение: {name}")
+                        yield name, None
+
+                page_bboxes = self.detector.detect_images([img for _, img in decoded])
+                pages = [(name, img, bboxes) for (name, img), bboxes in zip(decoded, page_bboxes)]
+                ready = [(img, bboxes) for _, img, bboxes in pages if bboxes is not None and len(bboxes)]
+                try:
+                    ready_texts = iter(self.recognize_pages(ready))
+                except Exception as e:
+                    logger.error(f"Ошибка пакетного OCR: {e}")
+                    ready_texts = iter([None] * len(ready))
+
+                for name, img, bboxes in pages:
+                    try:
+                        if bboxes is None:
+                            raise ValueError("ошибка детекции")
+                        texts = next(ready_texts) if len(bboxes) else None
+                        img = self.process_array(img, bboxes, texts, inplace=True)
+                        with self.metrics.stage("encode"):
+                            data = encode_image(img, fmt, quality)
+                        yield name, data
+                    except Exception as e:
+                        logger.error(f"Ошибка при обработке {name}: {e}")
+                        yield name, None
+
+    def process_bytes_to_archive(self, items: Iterable[tuple[str, bytes]], archive: ChapterArchive, fmt: str = "jpg",
+                                 quality: int = 95) -> dict:
+        results = {"total": 0, "success": 0, "failed": 0, "failed_files": []}
+        for name, data in self.iter_process_bytes(items, fmt, quality):
+            results["total"] += 1
+            if data is None:
+                results["failed"] += 1
+                results["failed_files"].append(name)
+                continue
+            # Страница уходит в архив сразу после кодирования и не накапливается в памяти
+            with self.metrics.stage("archive"):
+                archive.add_bytes(f"{Path(name).stem}.{fmt}", data)
+            results["success"] += 1
+        return results
+
     def process_image(self, input_path: str, output_path: str,
                      show_progress: bool = True) -> bool:
-        try:
-            img, bboxes = self.detector.detect(input_path)
-            if not bboxes:
-                logger.warning(f"На изображении {input_path} не найдено пузырей")
-                cv2.imwrite(output_path, img)
-                return True
+        return self._process_file(input_path, output_path, show_progress=show_progress) is not None
 
-            if show_progress:
-                bboxes_iter = tqdm(bboxes, desc="Обработка пузырей")
-            else:
-                bboxes_iter = bboxes
+    def _process_file(self, input_path: str, output_path: str, img: np.ndarray | None = None,
+                      bboxes: np.ndarray | None = None, texts: list[str | None] | None = None,
+                      translations: list[str] | None = None, show_progress: bool = False) -> list[dict] | None:
+        try:
+            if img is None:
+                img = cv2.imread(str(input_path))
+                if img is None:
+                    raise ValueError(f"Не удалось загрузить изображение: {input_path}")
 
-            for bbox in bboxes_iter:
-                img = self.process_single_bubble(img, bbox)
-            cv2.imwrite(output_path, img)
+            img, bubbles = self.process_page(img, bboxes, texts, translations, show_progress)
+            if not bubbles:
+                logger.warning(f"На изображении {input_path} не найдено пузырей")
+            with self.metrics.stage("write"):
+                cv2.imwrite(str(output_path), img)
             logger.info(f"Изображение сохранено: {output_path}")
-            return True
+            return bubbles
         except Exception as e:
             logger.error(f"Ошибка при обработке {input_path}: {e}")
-            return False
+            return None
+
+    def config_hashes(self) -> dict[str, str]:
+        return {
+            "ocr": config_hash({
+                "yolo_model_path": self.config["yolo_model_path"],
+                "conf_threshold": self.detector.conf_threshold,
+                # Окна детекции и слияние боксов меняют сами bboxes
+                "tiling": ([self.detector.tile_size, self.detector.tile_overlap, self.detector.tile_aspect,
+                            self.detector.tile_max_side] if self.detector.tile_size else None),
+                "merge_iou": self.detector.merge_iou,
+                "ocr_type": self.ocr_type,
+                "source_lang": self.source_lang,
+            }),
+            "translate": config_hash({
+                "translator_type": self.translator.translator_type,
+                "source_lang": self.source_lang,
+                "models": settings.TRANSLATION_MODELS if self.translator.translator_type == "transformers" else None,
+                "engine": ([settings.TRANSLATE_ENGINE, settings.TRANSLATE_NUM_BEAMS]
+                           if self.translator.translator_type == "transformers" and settings.TRANSLATE_ENGINE != "torch"
+                           else None),
+                "packing": ([settings.TRANSLATE_PACK_MAX_CHARS, settings.TRANSLATE_PACK_DELIMITER]
+                            if settings.TRANSLATE_PACKING else None),
+            }),
+            "render": config_hash({"selected_font": self.inpainter.selected_font}),
+        }
 
-    def process_batch(self, input_dir: str, output_dir: str) -> dict:
+    def process_batch(self, input_dir: str, output_dir: str, workers: int | None = None, resume: bool = False,
+                      on_page_done: Callable[[Path, Path, bool], None] | None = None, profile: bool = False) -> dict:
         input_dir = Path(input_dir)
         output_dir = Path(output_dir)
+        metrics_before = self.metrics.snapshot()
+        started = time.perf_counter()
 
         image_paths = []
         for ext in settings.SUPPORTED_EXTENSIONS:
             image_paths.extend(input_dir.glob(f"*{ext}"))
+        image_paths.sort()
 
         results = {
             "total": len(image_paths),
@@ -90,17 +320,208 @@ class MangaTranslatorPipeline:
             "failed_files": []
         }
 
-        def _process_file(img_path):
-            output_path = output_dir / img_path.name
-            success = self.process_image(str(img_path), str(output_path), show_progress=False)
-            return img_path.name, success
+        manifest = JobManifest.for_output_dir(output_dir) if settings.BATCH_MANIFEST else None
+        hashes = self.config_hashes()
+        input_hashes = {}
+        statuses = {}
+        stored = []
+        if manifest is not None:
+            for img_path in image_paths:
+                try:
+                    input_hashes[img_path] = file_hash(img_path)
+                except OSError as e:
+                    logger.error(f"Не удалось прочитать {img_path}: {e}")
 
-        for img_path in tqdm(image_paths, desc="Пакетная обработка"):
-            fname, success = _process_file(img_path)
-            if success:
+        if resume:
+            results["skipped"] = 0
+            for img_path in image_paths:
+                output_exists = (output_dir / img_path.name).exists()
+                if manifest is None or img_path.name not in manifest.pages:
+                    action = "skip" if output_exists else "full"
+                else:
+                    action = manifest.plan(img_path.name, input_hashes.get(img_path), hashes, output_exists)
+
+                if action == "skip":
+                    statuses[img_path] = True
+                    results["skipped"] += 1
+                elif action in ("render", "translate"):
+                    stored.append((img_path, action))
+            results["reused"] = len(stored)
+            logger.info(f"Пропущено уже обработанных изображений: {results['skipped']}, "
+                        f"повторная отрисовка без OCR: {results['reused']}")
+        reused = {img_path for img_path, _ in stored}
+        pending = [img_path for img_path in image_paths if img_path not in statuses and img_path not in reused]
+
+        def _page_done(img_path: Path, bubbles: list[dict] | None):
+            self.metrics.incr("pages_done" if bubbles is not None else "pages_failed")
+            if manifest is not None:
+                manifest.record(img_path.name, input_hashes.get(img_path), hashes, bubbles)
+            if on_page_done is not None:
+                on_page_done(img_path, output_dir / img_path.name, bubbles is not None)
+
+        profile_path = output_dir.parent / f"{output_dir.name}.prof"
+        profiler = profile_to(profile_path) if profile or settings.PROFILE_BATCH else nullcontext()
+        try:
+            with profiler as batch_profiler:
+                if stored:
+                    statuses.update(self._process_batch_stored(stored, output_dir, manifest, _page_done))
+
+                workers = _resolve_workers(workers or settings.BATCH_WORKERS, len(pending))
+                if workers > 1:
+                    if batch_profiler is not None:
+                        logger.warning("Профиль собирается только в главном процессе, время воркеров в него не попадет")
+                    statuses.update(self._process_batch_parallel(pending, output_dir, workers, _page_done))
+                elif settings.STREAMING_PIPELINE:
+                    statuses.update(self._process_batch_streaming(pending, output_dir, _page_done, batch_profiler))
+                else:
+                    statuses.update(self._process_batch_serial(pending, output_dir, _page_done))
+        finally:
+            if manifest is not None:
+                manifest.save()
+
+        for img_path in image_paths:
+            if statuses.get(img_path, False):
                 results["success"] += 1
             else:
                 results["failed"] += 1
-                results["failed_files"].append(fname)
+                results["failed_files"].append(img_path.name)
+
+        results["cache"] = self.cache_stats()
+        results["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        results.update(self.metrics.report(since=metrics_before))
+        if profile or settings.PROFILE_BATCH:
+            results["profile"] = str(profile_path)
         logger.info(f"Пакетная обработка завершена: {results['success']}/{results['total']} успешно")
         return results
+
+    def _process_batch_stored(self, stored: list[tuple[Path, str]], output_dir: Path, manifest: JobManifest,
+                              page_done) -> dict[Path, bool]:
+        statuses = {}
+        for img_path, action in tqdm(stored, desc="Повторная отрисовка"):
+            bubbles = manifest.bubbles(img_path.name)
+            bboxes = np.array([bubble["bbox"] for bubble in bubbles], dtype=np.int32).reshape(-1, 4)
+            texts = [bubble["text"] for bubble in bubbles]
+            translations = [bubble["translation"] for bubble in bubbles] if action == "render" else None
+            result = self._process_file(str(img_path), str(output_dir / img_path.name), bboxes=bboxes, texts=texts,
+                                        translations=translations)
+            statuses[img_path] = result is not None
+            page_done(img_path, result)
+        return statuses
+
+    def _process_batch_serial(self, image_paths: list[Path], output_dir: Path, page_done) -> dict[Path, bool]:
+        statuses = {}
+        detections = self.detector.iter_detect_batch(image_paths, self.detect_batch_size, self.decode_workers,
+                                                     self.decode_max_bytes)
+        progress = tqdm(total=len(image_paths), desc="Пакетная обработка")
+        for chunk in _chunked(detections, settings.OCR_PAGE_GROUP):
+            try:
+                chunk_texts = self.recognize_pages([(img, bboxes) for _, img, bboxes in chunk])
+            except Exception as e:
+                logger.error(f"Ошибка пакетного OCR: {e}")
+                chunk_texts = [None] * len(chunk)
+
+            for (img_path, img, bboxes), texts in zip(chunk, chunk_texts):
+                bubbles = self._process_file(str(img_path), str(output_dir / img_path.name), img, bboxes, texts)
+                statuses[img_path] = bubbles is not None
+                page_done(img_path, bubbles)
+                progress.update(1)
+        progress.close()
+
+        for img_path in image_paths:
+            if img_path not in statuses:
+                statuses[img_path] = False
+                page_done(img_path, None)
+        return statuses
+
+    def _process_batch_streaming(self, image_paths: list[Path], output_dir: Path, page_done,
+                                 profiler=None) -> dict[Path, bool]:
+        progress = tqdm(total=len(image_paths), desc="Пакетная обработка")
+
+        def _on_page_done(job):
+            bubbles = None
+            if job.error is None:
+                bubbles = _bubble_records(job.bboxes, job.texts, job.translations) if len(job.bboxes) else []
+            page_done(job.input_path, bubbles)
+            progress.update(1)
+
+        staged = StagedPipeline(self, settings.STAGE_QUEUE_SIZE, settings.OCR_PAGE_GROUP, profiler,
+                                settings.STAGE_MEMORY_MB * 1024 * 1024)
+        statuses = staged.run(image_paths, output_dir, on_page_done=_on_page_done)
+        progress.close()
+        return statuses
+
+    def _process_batch_parallel(self, image_paths: list[Path], output_dir: Path, workers: int,
+                                page_done) -> dict[Path, bool]:
+        statuses = {}
+        logger.info(f"Пакетная обработка в {workers} процессах")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(self.config,)) as executor:
+            futures = {
+                executor.submit(_process_in_worker, str(img_path), str(output_dir / img_path.name)): img_path
+                for img_path in image_paths
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Пакетная обработка"):
+                img_path = futures[future]
+                try:
+                    bubbles, worker_metrics = future.result()
+                    self.metrics.merge(worker_metrics)
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке {img_path}: {e}")
+                    bubbles = None
+                statuses[img_path] = bubbles is not None
+                page_done(img_path, bubbles)
+        return statuses
+
+
+def _bubble_records(bboxes: np.ndarray, texts: list[str | None],
+                    translations: list[str]) -> list[dict]:
+    return [
+        {"bbox": [int(v) for v in bbox], "text": text, "translation": translated}
+        for bbox, text, translated in zip(bboxes, texts, translations)
+    ]
+
+
+def _render_bands(bboxes: list[tuple[int, int, int, int]], band_height: int) -> list[tuple[int, int, list[int]]]:
+    # Пересекающиеся по вертикали пузыри всегда попадают в одну полосу
+    bands = []
+    for i in sorted(range(len(bboxes)), key=lambda i: bboxes[i][1]):
+        _, y1, _, y2 = bboxes[i]
+        if bands and (y1 < bands[-1][1] or bands[-1][1] - bands[-1][0] < band_height):
+            top, bottom, members = bands[-1]
+            bands[-1] = (top, max(bottom, y2), members + [i])
+        else:
+            bands.append((y1, y2, [i]))
+    return bands
+
+
+def _available_memory_mb() -> int | None:
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _resolve_workers(requested: int, n_images: int) -> int:
+    workers = max(1, min(requested, n_images, os.cpu_count() or 1))
+    available_mb = _available_memory_mb()
+    if available_mb is not None and workers > 1:
+        # Каждый процесс держит свой набор моделей, поэтому ограничиваем число процессов по памяти
+        memory_cap = max(1, available_mb // settings.WORKER_MEMORY_MB)
+        if memory_cap < workers:
+            logger.warning(f"Недостаточно памяти для {workers} процессов, используется {memory_cap}")
+            workers = memory_cap
+    return workers
+
+
+_worker_pipeline: MangaTranslatorPipeline | None = None
+
+
+def _init_worker(config: dict):
+    global _worker_pipeline
+    _worker_pipeline = MangaTranslatorPipeline(**config)
+
+
+def _process_in_worker(input_path: str, output_path: str) -> tuple[list[dict] | None, dict]:
+    before = _worker_pipeline.metrics.snapshot()
+    bubbles = _worker_pipeline._process_file(input_path, output_path)
+    return bubbles, _worker_pipeline.metrics.diff(before)
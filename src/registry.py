@@ -0,0 +1,90 @@
+import gc
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+from loguru import logger
+
+
+@dataclass
+class _Entry:
+    model: Any
+    loaded_at: float
+    last_used: float
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries: dict[Hashable, _Entry] = {}
+        self._key_locks: dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+            # Блокировка на ключ: одна модель грузится один раз, остальные модели грузятся параллельно
+            with key_lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    logger.info(f"Загрузка модели {key}")
+                    started = time.monotonic()
+                    model = loader()
+                    now = time.monotonic()
+                    entry = _Entry(model, now, now)
+                    with self._lock:
+                        self._entries[key] = entry
+                    logger.info(f"Модель {key} загружена за {now - started:.1f} с")
+        entry.last_used = time.monotonic()
+        return entry.model
+
+    def register(self, key: Hashable, model: Any):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = _Entry(model, now, now)
+
+    def is_loaded(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def loaded(self) -> list[Hashable]:
+        with self._lock:
+            return list(self._entries)
+
+    def unload(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        del entry
+        self._release_memory()
+        logger.info(f"Модель {key} выгружена")
+        return True
+
+    def unload_idle(self, max_idle_seconds: float) -> list[Hashable]:
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, entry in self._entries.items() if now - entry.last_used > max_idle_seconds]
+            for key in idle:
+                self._entries.pop(key)
+        if idle:
+            self._release_memory()
+            logger.info(f"Выгружены неиспользуемые модели: {idle}")
+        return idle
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._release_memory()
+
+    @staticmethod
+    def _release_memory():
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+registry = ModelRegistry()
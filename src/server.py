@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import json
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+from loguru import logger
+
+from config.settings import settings
+
+from .batcher import MicroBatcher
+from .image_io import CONTENT_TYPES, decode_image, encode_image
+from .language import detect_languages
+from .registry import registry
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class TranslationService:
+    def __init__(self, pipeline, max_batch_size: int | None = None, batch_latency_ms: float | None = None,
+                 max_pending: int | None = None, request_timeout: float | None = None):
+        self.pipeline = pipeline
+        max_batch_size = max_batch_size or settings.SERVER_MAX_BATCH_SIZE
+        latency = (batch_latency_ms if batch_latency_ms is not None else settings.SERVER_BATCH_LATENCY_MS) / 1000
+        self.max_pending = max_pending or settings.SERVER_MAX_PENDING
+        self.request_timeout = request_timeout or settings.SERVER_REQUEST_TIMEOUT
+
+        self.batchers = {
+            "detect": MicroBatcher(self._detect, max_batch_size, latency, name="detect"),
+            "ocr": MicroBatcher(pipeline.ocr.recognize_batch, pipeline.ocr.batch_size, latency, name="ocr"),
+            "translate": MicroBatcher(self._translate, settings.TRANSLATE_BATCH_SIZE, latency, name="translate"),
+        }
+        self._request_ids = itertools.count()
+        self.in_flight = 0
+        self.responses: dict[int, int] = {}
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def _detect(self, images: list[np.ndarray]) -> list:
+        return self.pipeline.detector.detect_images(images)
+
+    def _translate(self, items: list[tuple[str, str | None, int]]) -> list[str]:
+        # В батче смешаны реплики разных запросов: язык уже определен по своей странице,
+        # а реплики без языка группируются по запросу, чтобы голосование не шло по чужим страницам
+        results = [""] * len(items)
+        groups: dict[tuple, list[int]] = {}
+        for i, (_, lang, request_id) in enumerate(items):
+            groups.setdefault((lang, None) if lang else (None, request_id), []).append(i)
+        for (lang, _), ids in groups.items():
+            translated = self.pipeline.translator.translate_many([items[i][0] for i in ids], lang)
+            for i, text in zip(ids, translated):
+                results[i] = text
+        return results
+
+    async def translate_page(self, data: bytes, source_lang: str | None = None, fmt: str = "jpg",
+                             quality: int = 95) -> bytes:
+        img = await asyncio.to_thread(decode_image, data)
+        if img is None:
+            raise HTTPError(400, "Не удалось декодировать изображение")
+
+        bboxes = await self.batchers["detect"].submit(img)
+        if bboxes is None:
+            raise HTTPError(500, "Ошибка детекции")
+
+        if len(bboxes):
+            crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in bboxes]
+            texts = await self.batchers["ocr"].submit_many(crops)
+            texts = [text or "" for text in texts]
+            langs = [source_lang] * len(texts) if source_lang else await asyncio.to_thread(detect_languages, texts)
+            request_id = next(self._request_ids)
+            translations = await self.batchers["translate"].submit_many([(text, lang, request_id)
+                                                                         for text, lang in zip(texts, langs)])
+            img = await asyncio.to_thread(self.pipeline.render_bubbles, img, bboxes, texts, translations)
+
+        return await asyncio.to_thread(encode_image, img, fmt, quality)
+
+    async def _read_body(self, receive) -> bytes:
+        limit = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(499, "Клиент отключился")
+            body.extend(message.get("body", b""))
+            if len(body) > limit:
+                raise HTTPError(413, f"Размер файла превышает {settings.MAX_FILE_SIZE_MB}MB")
+            if not message.get("more_body", False):
+                return bytes(body)
+
+    async def _handle_translate(self, scope, receive) -> tuple[int, bytes, str]:
+        if self.in_flight >= self.max_pending:
+            raise HTTPError(503, "Сервис перегружен, повторите запрос позже")
+
+        query = parse_qs(scope.get("query_string", b"").decode())
+        fmt = query.get("format", ["jpg"])[0].lower()
+        if fmt not in CONTENT_TYPES:
+            raise HTTPError(400, f"Неподдерживаемый формат: {fmt}")
+        raw_quality = query.get("quality", ["95"])[0]
+        try:
+            quality = int(raw_quality)
+        except ValueError:
+            raise HTTPError(400, f"Некорректное качество: {raw_quality}") from None
+        if not 1 <= quality <= 100:
+            raise HTTPError(400, f"Качество должно быть от 1 до 100: {quality}")
+        source_lang = query.get("source_lang", [self.pipeline.source_lang])[0]
+        if source_lang == "auto":
+            source_lang = None
+
+        self.in_flight += 1
+        try:
+            body = await self._read_body(receive)
+            if not body:
+                raise HTTPError(400, "Пустое тело запроса")
+            try:
+                data = await asyncio.wait_for(self.translate_page(body, source_lang, fmt, quality), self.request_timeout)
+            except asyncio.TimeoutError:
+                raise HTTPError(504, f"Превышено время обработки ({self.request_timeout} с)")
+            return 200, data, CONTENT_TYPES[fmt]
+        finally:
+            self.in_flight -= 1
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "in_flight": self.in_flight,
+            "models": [str(key) for key in registry.loaded()],
+        }
+
+    def metrics(self) -> str:
+        lines = [
+            "# TYPE manga_translator_requests_total counter",
+            *(f'manga_translator_requests_total{{status="{status}"}} {count}' for status, count in self.responses.items()),
+            "# TYPE manga_translator_in_flight gauge",
+            f"manga_translator_in_flight {self.in_flight}",
+            "# TYPE manga_translator_request_seconds summary",
+            f"manga_translator_request_seconds_sum {self.latency_sum:.6f}",
+            f"manga_translator_request_seconds_count {self.latency_count}",
+            "# TYPE manga_translator_batches_total counter",
+            *(f'manga_translator_batches_total{{stage="{name}"}} {b.batches}' for name, b in self.batchers.items()),
+            "# TYPE manga_translator_batch_items_total counter",
+            *(f'manga_translator_batch_items_total{{stage="{name}"}} {b.items}' for name, b in self.batchers.items()),
+            "# TYPE manga_translator_queue_depth gauge",
+            *(f'manga_translator_queue_depth{{stage="{name}"}} {b.pending}' for name, b in self.batchers.items()),
+        ]
+        return "\n".join(lines) + "\n" + self.pipeline.prometheus_metrics()
+
+    async def _dispatch(self, scope, receive) -> tuple[int, bytes, str]:
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        if path == "/health" and method == "GET":
+            return 200, json.dumps(self.health(), ensure_ascii=False).encode(), "application/json"
+        if path == "/metrics" and method == "GET":
+            return 200, self.metrics().encode(), "text/plain; version=0.0.4"
+        if path == "/translate":
+            if method != "POST":
+                raise HTTPError(405, "Метод не поддерживается")
+            return await self._handle_translate(scope, receive)
+        raise HTTPError(404, "Не найдено")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await asyncio.to_thread(self.pipeline.preload)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for batcher in self.batchers.values():
+                    await batcher.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        started = time.perf_counter()
+        try:
+            status, body, content_type = await self._dispatch(scope, receive)
+        except HTTPError as e:
+            status, content_type = e.status, "application/json"
+            body = json.dumps({"error": e.message}, ensure_ascii=False).encode()
+        except Exception as e:
+            logger.error(f"Ошибка обработки запроса {scope['path']}: {e}")
+            status, content_type = 500, "application/json"
+            body = json.dumps({"error": str(e)}, ensure_ascii=False).encode()
+
+        self.responses[status] = self.responses.get(status, 0) + 1
+        if scope["path"].startswith("/translate"):
+            self.latency_sum += time.perf_counter() - started
+            self.latency_count += 1
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_app(pipeline=None, **kwargs) -> TranslationService:
+    if pipeline is None:
+        from .pipeline import MangaTranslatorPipeline
+        pipeline = MangaTranslatorPipeline(
+            source_lang=settings.SERVER_SOURCE_LANG,
+            selected_font=settings.SERVER_FONT,
+            ocr_type=settings.SERVER_OCR_TYPE,
+            translator_type=settings.SERVER_TRANSLATOR_TYPE,
+        )
+    return TranslationService(pipeline, **kwargs)
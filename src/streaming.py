@@ -0,0 +1,227 @@
+import queue
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import cv2
+import numpy as np
+from loguru import logger
+
+
+_DONE = object()
+
+
+@dataclass
+class PageJob:
+    input_path: Path
+    output_path: Path
+    image: np.ndarray | None = None
+    bboxes: np.ndarray = field(default_factory=lambda: np.zeros((0, 4), dtype=np.int32))
+    texts: list[str | None] = field(default_factory=list)
+    translations: list[str] = field(default_factory=list)
+    error: Exception | None = None
+
+
+class MemoryBudget:
+    def __init__(self, limit: int | None):
+        self.limit = limit
+        self.used = 0
+        self._cancelled = False
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes: int) -> bool:
+        with self._condition:
+            # Страница больше всего бюджета все равно проходит, но только когда конвейер пуст
+            while self.limit and self.used and self.used + nbytes > self.limit and not self._cancelled:
+                self._condition.wait()
+            if self._cancelled:
+                return False
+            self.used += nbytes
+            return True
+
+    def release(self, nbytes: int):
+        with self._condition:
+            self.used = max(0, self.used - nbytes)
+            self._condition.notify_all()
+
+    def cancel(self):
+        with self._condition:
+            self._cancelled = True
+            self._condition.notify_all()
+
+
+class StagedPipeline:
+    def __init__(self, pipeline, queue_size: int = 4, ocr_page_group: int = 4, profiler=None,
+                 memory_bytes: int | None = None):
+        self.pipeline = pipeline
+        self.profiler = profiler
+        self.memory_bytes = memory_bytes
+        self._budget = MemoryBudget(memory_bytes)
+        self.queue_size = max(1, queue_size)
+        self.ocr_page_group = max(1, ocr_page_group)
+        self._failure: Exception | None = None
+        self._failure_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _put(self, out_queue: queue.Queue, name: str, item):
+        self.pipeline.metrics.observe(f"queue_depth_{name}", out_queue.qsize())
+        out_queue.put(item)
+
+    def _fail(self, stage: str, error: Exception):
+        logger.error(f"Критическая ошибка на этапе {stage}: {error!r}")
+        with self._failure_lock:
+            if self._failure is None:
+                self._failure = error
+        self._stop.set()
+        self._budget.cancel()
+
+    def _thread(self, target, name: str, *args) -> threading.Thread:
+        def _run():
+            with self.profiler.thread() if self.profiler is not None else nullcontext():
+                target(*args)
+        return threading.Thread(target=_run, name=name)
+
+    @staticmethod
+    def _drain(in_queue: queue.Queue):
+        # Упавший этап продолжает разбирать входную очередь, иначе предыдущие этапы
+        # навсегда заблокируются на заполненной ограниченной очереди
+        while in_queue.get() is not _DONE:
+            pass
+
+    def run(self, image_paths: list[Path], output_dir: Path, on_page_done=None) -> dict[Path, bool]:
+        ocr_queue = queue.Queue(maxsize=self.queue_size)
+        translate_queue = queue.Queue(maxsize=self.queue_size)
+        render_queue = queue.Queue(maxsize=self.queue_size)
+        statuses = {}
+        self._failure = None
+        self._stop.clear()
+        self._budget = MemoryBudget(self.memory_bytes)
+
+        stages = [
+            self._thread(self._detect_stage, "detect", image_paths, output_dir, ocr_queue),
+            self._thread(self._ocr_stage, "ocr", ocr_queue, translate_queue),
+            self._thread(self._translate_stage, "translate", translate_queue, render_queue),
+            self._thread(self._render_stage, "render", render_queue, statuses, on_page_done),
+        ]
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+        if self._failure is not None:
+            raise self._failure
+        return statuses
+
+    def _detect_stage(self, image_paths: list[Path], output_dir: Path, out_queue: queue.Queue):
+        pending = set(image_paths)
+        try:
+            detections = self.pipeline.detector.iter_detect_batch(image_paths, self.pipeline.detect_batch_size,
+                                                                  self.pipeline.decode_workers,
+                                                                  self.pipeline.decode_max_bytes)
+            for img_path, img, bboxes in detections:
+                # Очереди ограничены числом страниц, а бюджет - суммарным объемом страниц между детекцией и записью
+                if self._stop.is_set() or not self._budget.acquire(img.nbytes):
+                    break
+                pending.discard(img_path)
+                self._put(out_queue, "ocr", PageJob(img_path, output_dir / img_path.name, img, bboxes))
+        except Exception as e:
+            logger.error(f"Ошибка на этапе детекции: {e}")
+        finally:
+            try:
+                if not self._stop.is_set():
+                    for img_path in image_paths:
+                        if img_path in pending:
+                            out_queue.put(PageJob(img_path, output_dir / img_path.name,
+                                                  error=ValueError(f"Не удалось обработать изображение: {img_path}")))
+            finally:
+                out_queue.put(_DONE)
+
+    def _ocr_stage(self, in_queue: queue.Queue, out_queue: queue.Queue):
+        done = False
+        try:
+            while not done:
+                jobs = [in_queue.get()]
+                # Забираем уже готовые страницы, чтобы OCR шел одним батчем по нескольким страницам
+                while len(jobs) < self.ocr_page_group and jobs[-1] is not _DONE:
+                    try:
+                        jobs.append(in_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if jobs[-1] is _DONE:
+                    jobs.pop()
+                    done = True
+                if self._stop.is_set():
+                    continue
+
+                ready = [job for job in jobs if job.error is None and len(job.bboxes)]
+                try:
+                    page_texts = self.pipeline.recognize_pages([(job.image, job.bboxes) for job in ready])
+                    for job, texts in zip(ready, page_texts):
+                        job.texts = texts
+                except Exception as e:
+                    logger.error(f"Ошибка на этапе OCR: {e}")
+                    for job in ready:
+                        job.error = e
+                for job in jobs:
+                    self._put(out_queue, "translate", job)
+        except Exception as e:
+            self._fail("ocr", e)
+        finally:
+            if not done:
+                self._drain(in_queue)
+            out_queue.put(_DONE)
+
+    def _translate_stage(self, in_queue: queue.Queue, out_queue: queue.Queue):
+        done = False
+        try:
+            while (job := in_queue.get()) is not _DONE:
+                if self._stop.is_set():
+                    continue
+                if job.error is None and job.texts:
+                    try:
+                        job.translations = self.pipeline.translate_texts(job.texts, job.bboxes)
+                    except Exception as e:
+                        logger.error(f"Ошибка на этапе перевода {job.input_path}: {e}")
+                        job.error = e
+                self._put(out_queue, "render", job)
+            done = True
+        except Exception as e:
+            self._fail("translate", e)
+        finally:
+            if not done:
+                self._drain(in_queue)
+            out_queue.put(_DONE)
+
+    def _render_stage(self, in_queue: queue.Queue, statuses: dict, on_page_done):
+        done = False
+        try:
+            while (job := in_queue.get()) is not _DONE:
+                if self._stop.is_set():
+                    continue
+                if job.error is None:
+                    try:
+                        img = job.image
+                        if len(job.bboxes):
+                            img = self.pipeline.render_bubbles(img, job.bboxes, job.texts, job.translations)
+                        else:
+                            logger.warning(f"На изображении {job.input_path} не найдено пузырей")
+                        with self.pipeline.metrics.stage("write"):
+                            cv2.imwrite(str(job.output_path), img)
+                        logger.info(f"Изображение сохранено: {job.output_path}")
+                    except Exception as e:
+                        job.error = e
+                if job.error is not None:
+                    logger.error(f"Ошибка при обработке {job.input_path}: {job.error}")
+                statuses[job.input_path] = job.error is None
+                if job.image is not None:
+                    self._budget.release(job.image.nbytes)
+                job.image = None
+                if on_page_done is not None:
+                    # Ошибка колбэка (например, переполненный диск при записи архива) останавливает весь конвейер
+                    on_page_done(job)
+            done = True
+        except Exception as e:
+            self._fail("render", e)
+        finally:
+            if not done:
+                self._drain(in_queue)
@@ -1,64 +1,254 @@
 import asyncio
+import os
+import threading
+import weakref
 from typing import Literal
 
-from langdetect import LangDetectException, detect
 from loguru import logger
-from transformers import pipeline
 
 from config.settings import settings
 
+from .cache import TranslationCache
+from .language import detect_language, detect_languages, detect_page_language
+from .page_text import pack_texts, split_translation
+from .registry import registry
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_pid: int | None = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    # Один фоновый event loop на процесс: синхронный API работает и там, где loop уже запущен,
+    # а новые экземпляры переводчика не оставляют за собой потоков
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid() or not _loop.is_running():
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            loop.call_soon(started.set)
+            threading.Thread(target=loop.run_forever, name="translator-loop", daemon=True).start()
+            # Без ожидания следующий вызов увидит еще не запущенный loop и создаст второй
+            started.wait()
+            _loop, _loop_pid = loop, os.getpid()
+        return _loop
+
 
 class MultiLanguageTranslator:
-    def __init__(self, translator_type: Literal["google", "transformers"] = None):
+    def __init__(self, translator_type: Literal["google", "transformers"] = None, cache: TranslationCache | None = None,
+                 client=None):
         self.translator = None
+        self.translator_type = translator_type
+        self.cache = cache
+        self._semaphores = weakref.WeakKeyDictionary()
         if translator_type == "google":
-            from googletrans import Translator
-            self.translator = Translator()
+            if client is None:
+                from googletrans import Translator
+                kwargs = {"service_urls": settings.GOOGLE_SERVICE_URLS} if settings.GOOGLE_SERVICE_URLS else {}
+                client = Translator(**kwargs)
+            self.translator = client
             logger.info("Переводчик инициализирован")
         elif translator_type == "transformers":
             self.translator = None
-            self.models = {
-                "ja": pipeline("translation", model="Helsinki-NLP/opus-mt-ja-ru"),
-                "en": pipeline("translation", model="Helsinki-NLP/opus-mt-en-ru")
-            }
             logger.info("Переводчик инициализирован")
         else:
             logger.error("Неизвестный тип переводчика")
 
     def detect_language(self, text: str) -> str | None:
-        try:
-            lang = detect(text)
-            return lang if lang in settings.SUPPORTED_LANGUAGES else None
-        except LangDetectException:
-            return None
+        return detect_language(text)
 
-    def translate(self, text: str, source_lang: str = None, target_lang: str = "ru") -> str:
-        if not text.strip():
-            return ""
+    def detect_page_language(self, texts: list[str]) -> str | None:
+        return detect_page_language(texts)
 
-        if source_lang is None:
-            source_lang = self.detect_language(text)
-            if source_lang is None:
-                logger.warning(f"Не удалось определить язык текста: {text}...")
-                return text
+    def get_model(self, source_lang: str):
+        model_name = settings.TRANSLATION_MODELS[source_lang]
+        if settings.TRANSLATE_ENGINE == "onnx":
+            def _load_onnx():
+                from .onnx_translator import OnnxMarianTranslator
+                return OnnxMarianTranslator(model_name, settings.MODEL_DIR / "onnx", settings.TRANSLATE_NUM_BEAMS,
+                                            settings.TRANSLATE_MAX_LENGTH)
 
-        logger.info(f"Перевод с {source_lang} на {target_lang}: {text}...")
+            return registry.get(("translation", model_name, "onnx"), _load_onnx)
 
-        if source_lang == target_lang:
-            return text
+        def _load():
+            from transformers import pipeline
+            return pipeline("translation", model=model_name)
 
-        if self.translator:
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            ru_text = loop.run_until_complete(self.translator.translate(text, src=source_lang, dest="ru"))
-            return ru_text.text
-        else:
+        return registry.get(("translation", model_name), _load)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(settings.TRANSLATE_CONCURRENCY)
+        return self._semaphores[loop]
+
+    async def _google_translate_one(self, text: str, source_lang: str, target_lang: str) -> str | None:
+        semaphore = self._semaphore()
+        for attempt in range(settings.TRANSLATE_RETRIES + 1):
             try:
-                ru_text = self.models[source_lang](text)[0]["translation_text"]
-                return ru_text
+                async with semaphore:
+                    result = await asyncio.wait_for(self.translator.translate(text, src=source_lang, dest=target_lang),
+                                                    timeout=settings.TRANSLATE_TIMEOUT)
+                return result.text
             except Exception as e:
-                logger.error(f"Ошибка перевода: {e}")
-                return text
+                if attempt == settings.TRANSLATE_RETRIES:
+                    logger.error(f"Ошибка перевода: {e!r}")
+                    return None
+                delay = settings.TRANSLATE_BACKOFF * 2 ** attempt
+                logger.warning(f"Ошибка перевода ({e!r}), повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+
+    async def _google_translate_many(self, texts: list[str], source_lang: str, target_lang: str) -> list[str | None]:
+        return await asyncio.gather(*(self._google_translate_one(text, source_lang, target_lang) for text in texts))
+
+    def _transformers_translate_many(self, texts: list[str], source_lang: str) -> list[str | None]:
+        # Сортировка по длине уменьшает паддинг внутри батча
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        # Ошибка загрузки модели или движка не глушится: иначе страница молча уходит в вывод без перевода
+        model = self.get_model(source_lang)
+        try:
+            outputs = model([texts[i] for i in order], batch_size=settings.TRANSLATE_BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"Ошибка перевода: {e}")
+            return [None] * len(texts)
+
+        translated = [""] * len(texts)
+        for i, output in zip(order, outputs):
+            translated[i] = output["translation_text"]
+        return translated
+
+    async def atranslate_many(self, texts: list[str], source_lang: str = None, target_lang: str = "ru") -> list[str]:
+        results = [""] * len(texts)
+        groups: dict[str, dict[str, list[int]]] = {}
+        langs = [source_lang] * len(texts) if source_lang else detect_languages(texts)
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+
+            normalized = " ".join(text.split())
+            lang = langs[i]
+            if lang is None:
+                logger.warning(f"Не удалось определить язык текста: {text}...")
+                results[i] = text
+                continue
+            if lang == target_lang:
+                results[i] = text
+                continue
+            groups.setdefault(lang, {}).setdefault(normalized, []).append(i)
+
+        for lang, unique in groups.items():
+            translated = self._cache_get(list(unique), lang, target_lang)
+            sources = [text for text in unique if text not in translated]
+            logger.info(f"Перевод с {lang} на {target_lang}: {len(sources)} уникальных строк "
+                        f"из {sum(len(ids) for ids in unique.values())}")
+            if sources:
+                if self.translator:
+                    outputs = await self._google_translate_many(sources, lang, target_lang)
+                else:
+                    outputs = await asyncio.to_thread(self._transformers_translate_many, sources, lang)
+                fresh = {source: output for source, output in zip(sources, outputs) if output is not None}
+                self._cache_set(fresh, lang, target_lang)
+                translated.update(fresh)
+
+            for source, ids in unique.items():
+                for i in ids:
+                    results[i] = translated.get(source, texts[i])
+        return results
+
+    async def atranslate_packed(self, texts: list[str], source_lang: str = None, target_lang: str = "ru") -> list[str]:
+        # texts уже в порядке чтения: соседние реплики одного языка уходят одним запросом и переводятся с контекстом
+        results = [text or "" for text in texts]
+        langs = [source_lang] * len(texts) if source_lang else detect_languages(texts)
+        active = [i for i, text in enumerate(texts) if text and text.strip() and langs[i] is not None]
+        if len(active) < 2:
+            return await self.atranslate_many(texts, source_lang, target_lang)
+
+        # Пакет собирается только из подряд идущих реплик одного языка: английский SFX на японской
+        # странице разрывает пакет и уходит в свою модель
+        runs: list[list[int]] = []
+        for i in active:
+            if runs and langs[runs[-1][-1]] == langs[i]:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+
+        delimiter = settings.TRANSLATE_PACK_DELIMITER
+        sources = {i: " ".join(texts[i].split()) for i in active}
+        packs_by_lang: dict[str, list[list[int]]] = {}
+        for run in runs:
+            for pack in pack_texts([sources[i] for i in run], settings.TRANSLATE_PACK_MAX_CHARS, delimiter):
+                packs_by_lang.setdefault(langs[run[0]], []).append([run[j] for j in pack])
+
+        fallback: dict[str, list[int]] = {}
+        for lang, packs in packs_by_lang.items():
+            packed = await self.atranslate_many([delimiter.join(sources[i] for i in pack) for pack in packs],
+                                                lang, target_lang)
+            for pack, translated in zip(packs, packed):
+                parts = split_translation(translated, delimiter, len(pack)) if len(pack) > 1 else [translated]
+                if parts is None:
+                    fallback.setdefault(lang, []).extend(pack)
+                    continue
+                for i, part in zip(pack, parts):
+                    results[i] = part
+
+        for lang, ids in fallback.items():
+            # Разделитель потерялся при переводе: эти реплики переводятся по одной
+            logger.debug(f"Не удалось разделить пакетный перевод, поштучный перевод {len(ids)} реплик")
+            singles = await self.atranslate_many([sources[i] for i in ids], lang, target_lang)
+            for i, translated in zip(ids, singles):
+                results[i] = translated
+
+        undetected = [i for i, text in enumerate(texts) if text and text.strip() and langs[i] is None]
+        if undetected:
+            logger.warning(f"Не удалось определить язык {len(undetected)} реплик, они оставлены без перевода")
+        logger.info(f"Перевод страницы: {len(active)} реплик в {sum(map(len, packs_by_lang.values()))} запросах")
+        return results
+
+    def translate_packed(self, texts: list[str], source_lang: str = None, target_lang: str = "ru") -> list[str]:
+        return self._run(self.atranslate_packed(texts, source_lang, target_lang))
+
+    async def atranslate(self, text: str, source_lang: str = None, target_lang: str = "ru") -> str:
+        return (await self.atranslate_many([text], source_lang, target_lang))[0]
+
+    def translate_many(self, texts: list[str], source_lang: str = None, target_lang: str = "ru") -> list[str]:
+        return self._run(self.atranslate_many(texts, source_lang, target_lang))
+
+    def translate(self, text: str, source_lang: str = None, target_lang: str = "ru") -> str:
+        return self._run(self.atranslate(text, source_lang, target_lang))
+
+    def _cache_namespace(self, source_lang: str) -> str:
+        # Переводы разных моделей и движков не должны подменять друг друга через общий кэш
+        if self.translator_type != "transformers":
+            return self.translator_type
+        model_name = settings.TRANSLATION_MODELS.get(source_lang, "")
+        if settings.TRANSLATE_ENGINE == "torch":
+            return f"transformers:{model_name}:torch"
+        return f"transformers:{model_name}:{settings.TRANSLATE_ENGINE}:{settings.TRANSLATE_NUM_BEAMS}"
+
+    def _cache_get(self, texts: list[str], source_lang: str, target_lang: str) -> dict[str, str]:
+        if self.cache is None or not texts:
+            return {}
+        namespace = self._cache_namespace(source_lang)
+        keys = {TranslationCache.make_key(text, source_lang, target_lang, namespace): text for text in texts}
+        try:
+            found = self.cache.get_many(list(keys))
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кэша переводов: {e}")
+            return {}
+        return {keys[key]: value for key, value in found.items()}
+
+    def _cache_set(self, translations: dict[str, str], source_lang: str, target_lang: str):
+        if self.cache is None or not translations:
+            return
+        namespace = self._cache_namespace(source_lang)
+        try:
+            self.cache.set_many({
+                TranslationCache.make_key(text, source_lang, target_lang, namespace): value
+                for text, value in translations.items()
+            })
+        except Exception as e:
+            logger.warning(f"Ошибка записи в кэш переводов: {e}")